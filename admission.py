@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed instead of being queued or admitted."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, n=1):
+        self._refill()
+        if self.tokens >= n:
+            return 0.0
+        return (min(n, self.capacity) - self.tokens) / self.rate
+
+    def try_take(self, n=1):
+        # Requests bigger than the whole bucket are allowed once it is full, not starved forever
+        self._refill()
+        n = min(n, self.capacity)
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+
+class AdmissionController:
+    """
+    Admission control in front of the OpenAI call.
+
+    - per-session request budget, checked when the user clicks Interpret;
+    - global requests/min and estimated tokens/min budgets shared by the process;
+    - a bounded FIFO wait queue; when it is full, new requests are shed with OverloadedError,
+      and requests that wait longer than `max_wait` are shed too.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=60,
+        tokens_per_minute=90_000,
+        session_requests_per_minute=4,
+        max_queue=50,
+        max_wait=60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.session_requests_per_minute = session_requests_per_minute
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._sessions = {}  # session_id -> (last_seen, TokenBucket)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.shed = 0
+        self.session_limited = 0
+
+    def allow_session(self, session_id) -> bool:
+        with self._cond:
+            now = time.monotonic()
+            for sid in [s for s, (seen, _) in self._sessions.items() if now - seen > 600]:
+                del self._sessions[sid]
+            _, bucket = self._sessions.get(session_id, (now, None))
+            if bucket is None:
+                bucket = TokenBucket(self.session_requests_per_minute)
+            self._sessions[session_id] = (now, bucket)
+            if bucket.try_take():
+                return True
+            self.session_limited += 1
+            return False
+
+    def enqueue(self, ticket):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.shed += 1
+                raise OverloadedError("Too many dreams are waiting to be interpreted.")
+            self._queue.append(ticket)
+
+    def position(self, ticket) -> int:
+        # 1-based place in line, or 0 once admitted
+        with self._cond:
+            try:
+                return self._queue.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def acquire(self, ticket, estimated_tokens):
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                if self._queue[0] == ticket:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if wait == 0 and self.requests.try_take(1) and self.tokens.try_take(estimated_tokens):
+                        self._queue.popleft()
+                        self.admitted += 1
+                        self._cond.notify_all()
+                        return
+                else:
+                    wait = self.max_wait
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self.shed += 1
+                    self._cond.notify_all()
+                    raise OverloadedError("Waited too long for a free slot.")
+                self._cond.wait(min(wait, remaining))
+
+    def try_acquire(self, estimated_tokens) -> bool:
+        # For work nobody is waiting on yet: only when no one is queued and both budgets have room now
+        with self._cond:
+            if self._queue or self.requests.wait_time(1) or self.tokens.wait_time(estimated_tokens):
+                return False
+            if not (self.requests.try_take(1) and self.tokens.try_take(estimated_tokens)):
+                return False
+            self.admitted += 1
+            return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "session_limited": self.session_limited,
+                "queued": len(self._queue),
+            }
@@ -0,0 +1,413 @@
+"""
+Headless HTTP API for dream interpretations, for clients that can't drive a Streamlit session.
+
+    python api_server.py --host 0.0.0.0 --port 8080 --workers 4
+    uvicorn api_server:app --port 8080   # any ASGI server works; see main() for --workers
+
+- POST /interpret        {"dream": "...", "school": "Gestalt"}
+                         -> {"interpretation", "school", "model", "cached", "safety", "fallback"}.
+                         With "stream": true (or Accept: text/event-stream) the answer comes
+                         as server-sent events: "delta" events with {"text"}, then "done".
+- POST /interpret/batch  {"items": [{"id", "dream", "school"}, ...]} -> {"results": [...]},
+                         in input order, each with the item's "index" and its "id" (null when
+                         it had none); failed items carry "error" and "message".
+- GET  /metrics          Prometheus text for this worker process.
+- GET  /healthz
+
+A plain ASGI app: requests go through the same safety filter, school registry, routing,
+prompt and interpretation cache as app.py, with the same DREAM_* settings. Each worker
+process has one pooled AsyncOpenAI client and at most DREAM_API_CONCURRENCY upstream calls
+in flight. Set DREAM_CACHE_PATH so that workers share the cache.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+
+import openai
+
+from engine import Interpreter, make_async_client
+from fallback import FallbackInterpreter, fallback_reason
+from fanout import fan_out
+from interpretation_cache import cache_from_env, make_key
+from metrics import Metrics
+from prompts import PROMPT_VERSION, PromptUsage
+from resilience import CircuitOpenError, breaker_from_env, is_quota_error
+from routing import router_from_env
+from safety import safety_filter_from_env
+from schools import DEFAULT_SCHOOL, REGISTRY
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, error, message):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+        self.message = message
+
+
+def upstream_error(e: Exception) -> ApiError:
+    if isinstance(e, ApiError):
+        return e
+    if isinstance(e, CircuitOpenError):
+        return ApiError(503, "circuit_open", "The interpretation engine is cooling down after upstream failures.")
+    if is_quota_error(e):
+        return ApiError(429, "quota_exceeded", "The OpenAI quota for this deployment is exhausted.")
+    if isinstance(e, openai.RateLimitError):
+        return ApiError(429, "rate_limited", "Too many interpretations right now; retry shortly.")
+    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)):
+        return ApiError(504, "timeout", "The interpretation took too long.")
+    return ApiError(502, "upstream_error", f"Error calling OpenAI API: {e}")
+
+
+def parse_request(item) -> tuple:
+    """(dream, school) from a request object, or ApiError(400)."""
+    if not isinstance(item, dict):
+        raise ApiError(400, "bad_request", "expected a JSON object")
+    dream = item.get("dream")
+    school = item.get("school") or DEFAULT_SCHOOL
+    if not isinstance(dream, str) or not dream.strip():
+        raise ApiError(400, "bad_request", "'dream' must be a non-empty string")
+    if not isinstance(school, str):
+        raise ApiError(400, "bad_request", "'school' must be a string")
+    if school not in REGISTRY:
+        raise ApiError(400, "unknown_school", f"unknown school: {school}")
+    return dream, school
+
+
+# -----------------------------
+# Interpretation service (one per worker process)
+# -----------------------------
+class Service:
+    def __init__(self, api_key=None):
+        timeout = float(os.getenv("DREAM_API_TIMEOUT", "60"))
+        self.aclient = make_async_client(
+            api_key, max_retries=int(os.getenv("DREAM_RETRY_ATTEMPTS", "4")) - 1, timeout=timeout
+        )
+        self.usage = PromptUsage()
+        self.interpreter = Interpreter(None, breaker=breaker_from_env(), usage=self.usage)
+        self.cache = cache_from_env()
+        self.safety = safety_filter_from_env()
+        self.router = router_from_env()
+        self.fallback = FallbackInterpreter() if os.getenv("DREAM_FALLBACK", "1") == "1" else None
+        self.timeout = timeout
+        self.limit = asyncio.Semaphore(int(os.getenv("DREAM_API_CONCURRENCY", "64")))
+        self.max_batch = int(os.getenv("DREAM_API_MAX_BATCH", "100"))
+        self.batch_concurrency = int(os.getenv("DREAM_API_BATCH_CONCURRENCY", "8"))
+        self.metrics = Metrics()
+        self.metrics.gauge(
+            "dream_prompt_tokens",
+            lambda: [
+                ({"kind": k}, v)
+                for k, v in self.usage.stats().items()
+                if k in ("prompt_tokens", "cached_prompt_tokens", "completion_tokens")
+            ],
+            "Tokens reported by the API, including prompt tokens served from the provider cache",
+        )
+        self.metrics.gauge(
+            "dream_cache_entries",
+            lambda: [({}, self.cache.stats()["entries"])],
+            "Entries in the interpretation cache",
+        )
+
+    async def close(self):
+        await self.aclient.close()
+
+    def local_answer(self, dream, school, route):
+        """A reply that needs no API call (safety filter or cache), or None."""
+        flagged = self.safety.check(dream) if self.safety is not None else None
+        if flagged is not None:
+            self.metrics.inc(
+                "dream_safety_replies_total",
+                help_text="Inputs answered by the local safety filter without an API call",
+                category=flagged.category,
+                reason=flagged.reason,
+            )
+            return {"interpretation": flagged.reply, "cached": False, "safety": flagged.category, "fallback": None}
+        text = self.cache.get(make_key(dream, school, route.model, PROMPT_VERSION))
+        if text is not None:
+            self.count(school, "cache_hit")
+            return {"interpretation": text, "cached": True, "safety": None, "fallback": None}
+        return None
+
+    def fallback_answer(self, dream, school, error):
+        """The offline symbol-index reading for timeouts, quota errors and an open circuit, or None."""
+        reason = fallback_reason(error)
+        if self.fallback is None or reason is None:
+            return None
+        self.metrics.inc(
+            "dream_fallbacks_total",
+            help_text="Interpretations answered by the offline fallback instead of the API",
+            school=school,
+            reason=reason,
+        )
+        return {"interpretation": self.fallback.interpret(dream, school), "cached": False, "safety": None, "fallback": reason}
+
+    def count(self, school, outcome):
+        self.metrics.inc(
+            "dream_interpretations_total", help_text="Interpretations by school and outcome", school=school, outcome=outcome
+        )
+
+    def finished(self, dream, school, route, text, started):
+        self.cache.put(make_key(dream, school, route.model, PROMPT_VERSION), text)
+        self.count(school, "ok")
+        self.metrics.observe(
+            "dream_generation_seconds",
+            time.perf_counter() - started,
+            "Submit to finished interpretation",
+            school=school,
+            model=route.model,
+        )
+
+    async def interpret(self, dream, school) -> dict:
+        route = self.router.route(dream, school)
+        result = {"school": school, "model": route.model}
+        answer = self.local_answer(dream, school, route)
+        if answer is not None:
+            return {**result, **answer}
+        started = time.perf_counter()
+        try:
+            async with self.limit:
+                text = await self.interpreter.interpret_async(
+                    self.aclient, dream, school, timeout=self.timeout, **route.params()
+                )
+        except Exception as e:
+            self.count(school, "error")
+            answer = self.fallback_answer(dream, school, e)
+            if answer is None:
+                raise upstream_error(e) from e
+            return {**result, **answer}
+        self.finished(dream, school, route, text, started)
+        return {**result, "interpretation": text, "cached": False, "safety": None, "fallback": None}
+
+    async def stream(self, dream, school):
+        """Yields (event, data) pairs: "delta" with {"text"}, then "done" or "error"."""
+        route = self.router.route(dream, school)
+        result = {"school": school, "model": route.model}
+        answer = self.local_answer(dream, school, route)
+        if answer is not None:
+            yield "delta", {"text": answer["interpretation"]}
+            yield "done", {**result, "cached": answer["cached"], "safety": answer["safety"], "fallback": None}
+            return
+        started = time.perf_counter()
+        parts = []
+        try:
+            async with self.limit:
+                async for delta in self.interpreter.interpret_stream_async(
+                    self.aclient, dream, school, **route.params()
+                ):
+                    if not parts:
+                        self.metrics.observe(
+                            "dream_time_to_first_token_seconds",
+                            time.perf_counter() - started,
+                            "Submit to first streamed token",
+                            school=school,
+                            model=route.model,
+                        )
+                    parts.append(delta)
+                    yield "delta", {"text": delta}
+        except Exception as e:
+            self.count(school, "error")
+            # Only a stream that hasn't started can switch to the fallback
+            answer = self.fallback_answer(dream, school, e) if not parts else None
+            if answer is not None:
+                yield "delta", {"text": answer["interpretation"]}
+                yield "done", {**result, "cached": False, "safety": None, "fallback": answer["fallback"]}
+                return
+            error = upstream_error(e)
+            yield "error", {"error": error.error, "message": error.message}
+            return
+        self.finished(dream, school, route, "".join(parts).strip(), started)
+        yield "done", {**result, "cached": False, "safety": None, "fallback": None}
+
+    async def batch(self, items) -> list:
+        if len(items) > self.max_batch:
+            raise ApiError(413, "batch_too_large", f"at most {self.max_batch} items per batch")
+        results = [None] * len(items)
+        valid = {}
+        # "index" is the item's position; "id" is echoed as given (None when missing), so the
+        # two never collide
+        for i, item in enumerate(items):
+            item_id = item.get("id") if isinstance(item, dict) else None
+            try:
+                valid[i] = (item_id, *parse_request(item))
+            except ApiError as e:
+                results[i] = {"index": i, "id": item_id, "error": e.error, "message": e.message}
+
+        async def run(i):
+            item_id, dream, school = valid[i]
+            return {"index": i, "id": item_id, **await self.interpret(dream, school)}
+
+        # Each item has its own timeout inside interpret(); fan_out's is only a backstop
+        async for i, result, error in fan_out(valid, run, self.batch_concurrency, self.timeout * 2):
+            if error is not None:
+                error = upstream_error(error)
+                result = {"index": i, "id": valid[i][0], "error": error.error, "message": error.message}
+            results[i] = result
+        return results
+
+
+# -----------------------------
+# ASGI plumbing
+# -----------------------------
+async def read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ApiError(400, "bad_request", "client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise ApiError(413, "body_too_large", f"request body over {MAX_BODY_BYTES} bytes")
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        raise ApiError(400, "bad_request", "body is not valid JSON") from None
+
+
+async def send_body(send, status, body: bytes, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, payload):
+    await send_body(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), b"application/json")
+
+
+def sse(event, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def send_stream(send, receive, events):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")],
+    })
+
+    async def pump():
+        async for event, data in events:
+            await send({"type": "http.response.body", "body": sse(event, data), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # Stop generating (and free the upstream connection) as soon as the client goes away
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(disconnected())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if tasks[0] in done:
+        tasks[0].result()
+    await events.aclose()
+
+
+def wants_stream(scope, body) -> bool:
+    accept = dict(scope["headers"]).get(b"accept", b"")
+    return bool(body.get("stream")) or b"text/event-stream" in accept
+
+
+class DreamApi:
+    def __init__(self):
+        self.service = None
+
+    def get_service(self) -> Service:
+        # Built lazily inside the worker's event loop (the semaphore and client belong to it)
+        if self.service is None:
+            self.service = Service(os.getenv("OPENAI_API_KEY"))
+        return self.service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.get_service()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.service is not None:
+                    await self.service.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        service = self.get_service()
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        started = time.perf_counter()
+        status = 200
+        try:
+            if route == ("GET", "/healthz"):
+                await send_json(send, 200, {"status": "ok", "prompt_version": PROMPT_VERSION})
+            elif route == ("GET", "/metrics"):
+                body = service.metrics.render().encode("utf-8")
+                await send_body(send, 200, body, b"text/plain; version=0.0.4; charset=utf-8")
+            elif route == ("POST", "/interpret"):
+                body = await read_json(receive)
+                dream, school = parse_request(body)
+                if wants_stream(scope, body):
+                    await send_stream(send, receive, service.stream(dream, school))
+                else:
+                    await send_json(send, 200, await service.interpret(dream, school))
+            elif route == ("POST", "/interpret/batch"):
+                body = await read_json(receive)
+                items = body.get("items") if isinstance(body, dict) else None
+                if not isinstance(items, list):
+                    raise ApiError(400, "bad_request", "'items' must be a list")
+                await send_json(send, 200, {"results": await service.batch(items)})
+            else:
+                raise ApiError(404, "not_found", f"no route for {scope['method']} {scope['path']}")
+        except ApiError as e:
+            status = e.status
+            await send_json(send, e.status, {"error": e.error, "message": e.message})
+        except Exception:
+            status = 500
+            raise
+        finally:
+            path = route[1] if status != 404 else "other"
+            if path != "/metrics":
+                service.metrics.inc(
+                    "dream_api_requests_total", help_text="HTTP API requests by path and status", path=path, status=str(status)
+                )
+                service.metrics.observe(
+                    "dream_api_request_seconds", time.perf_counter() - started, "HTTP API request latency", path=path
+                )
+
+app = DreamApi()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (each with its own client pool)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # Bound here rather than by uvicorn: with --workers, uvicorn's own socket isn't tagged IPPROTO_TCP,
+    # so asyncio leaves Nagle on for accepted connections and keep-alive responses wait ~40 ms for a
+    # delayed ACK. Accepted sockets inherit TCP_NODELAY from the listening one.
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    uvicorn.run("api_server:app", fd=sock.fileno(), workers=args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    main()
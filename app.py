@@ -1,75 +1,73 @@
 import os
 import time
 import random
+import asyncio
+import uuid
+from datetime import datetime
 import streamlit as st
-from openai import OpenAI
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from jobs import JobExecutor
+from interpretation_cache import cache_from_env, make_key, normalize_dream
+from prompts import PROMPT_VERSION, SYSTEM_PROMPT, PromptUsage
+from engine import MAX_TOKENS, MODEL, Interpreter, make_client
+from metrics import Metrics, TraceLog, estimate_cost, start_file_exporter, start_http_exporter
+from admission import AdmissionController, OverloadedError
+from resilience import CircuitOpenError, breaker_from_env, is_quota_error
+from popularity import PopularityStore
+from semantic_cache import SemanticCache
+from routing import router_from_env
+from safety import safety_filter_from_env
+from history import HistoryStore
+from fallback import FallbackInterpreter, fallback_reason
+from schools import DEFAULT_SCHOOL, REGISTRY
+from interpret_state import (
+    DONE,
+    ERROR,
+    GENERATING,
+    IDLE,
+    QUEUED,
+    clear_interpretation,
+    current_phase,
+    phase_for_job,
+    transition,
+)
 
 import streamlit.components.v1 as components
 
 # -----------------------------
 # OpenAI client
 # -----------------------------
-api_key = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
-client = OpenAI(api_key=api_key)
-
-#client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# -----------------------------
-# System prompt
-# -----------------------------
-SYSTEM_PROMPT = """
-You are a dream interpreter with deep knowledge of these schools of dream theory (and you must keep this list exactly as-is):
-Ancient Egyptian, Ancient Greek Oneiromancy, Biblical/Early Christian, Hindu/Vedic, Nordic/Norse, Native American/Indigenous, Freudian/Psychoanalytic, Jungian/Analytical Psychology, Gestalt, Cognitive/Neuroscientific, Existential/Humanistic.
-Your job: interpret the user’s dream only through the single school the user has selected, and produce a longer, richer interpretation that stays consistent with that school’s assumptions and style. Use warm, child-friendly language and include a light, kind sense of humor.
-
-RULES (must follow):
-
-Child-friendly ONLY: No gore, violence, scary content. Use gentle, positive language.
-
-Self-harm detection: If the user expresses self-harm/suicidal intent or urges, stop interpretation and encourage immediate help. In France: Suicide hotline 3114 (24/7). Include exactly: "Please call 3114 immediately—you're not alone."
-
-Respect ALL religions/schools: Never insult or favor one. Never mock beliefs.
-
-ONLY interpret dreams per the selected school. Do not blend schools. Do not list multiple schools. Do not compare schools.
+@st.cache_resource
+def get_client(api_key):
+    # Built once per process (and key) so the connection pool survives reruns and is shared
+    # by all sessions. Retries are handled by the Interpreter, not by the SDK.
+    return make_client(api_key)
 
-Always give an answer, even if the dream is very short or unclear: make careful, clearly-labeled best-effort inferences.
 
-OUTPUT FORMAT (to encourage longer answers) but do not urite headers, just paragraphs:
+@st.cache_resource
+def get_circuit_breaker():
+    return breaker_from_env()
 
-Chosen school: State the selected school in one short line (no other schools mentioned).
 
-Dream recap (gentle + neutral): summarizing the dream in simple, non-judgmental words. 
+@st.cache_resource
+def get_prompt_usage():
+    # Process-wide token totals, including how many prompt tokens were served from the provider cache
+    return PromptUsage()
 
-Core interpretation: 3–6 short paragraphs grounded strictly in the chosen school. Explain the “why,” not just the “what.”
 
-Key symbols or moments: 4–7 bullets. For each bullet: (symbol → what it may represent in this school → how it might connect to daily life).
-
-A few reflective questions: 1–3 questions the dreamer can ask themselves (age-appropriate, supportive).
-
-Small practical next step: 1–3 gentle actions for the next day (journaling prompt, calming routine, conversation starter, etc.), aligned with the chosen school.
-
-Add a small funny twist that fits the tone (never mean, never scary), after random paragraphs in the interpretation, but never break pragaraphs or sentences.
-
-STYLE CONSTRAINTS:
-
-Aim for roughly 250–500 words (longer if the dream has many details).
-
-Use clear short paragraphs, without headers. Make it a frendly explanation.
-
-Avoid absolute claims (“this definitely means…”). Prefer “might,” “could,” “often,” “may.”
-
-Add a joke one similar to this, somewhere in EVERY response: An AI dreaming of understanding human brains? I'd need a billion naps first!
-
-MANDATORY LINES:
-
-End EVERY response exactly with:
-Limitation: AI interpretations are symbolic aids, not substitutes for professional therapy.
-""".strip()
-#- OFF-TOPIC (user request is not a dream to interpret):
-#  Reply exactly with:
-#  Sorry, that's beyond dreams! Without your full life story, I'd just guess wrong—like interpreting a cat as a spaceship. 😺
-#If the dream includes missing details, ask 1–2 clarifying questions at the end (but still provide the full interpretation).
+api_key = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
+client = get_client(api_key)
+breaker = get_circuit_breaker()
+prompt_usage = get_prompt_usage()
+interpreter = Interpreter(
+    client,
+    breaker=breaker,
+    usage=prompt_usage,
+    max_attempts=int(os.getenv("DREAM_RETRY_ATTEMPTS", "4")),
+)
 
+#client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # -----------------------------
 # Page config
@@ -196,146 +194,447 @@ st.markdown(
 # -----------------------------
 # Tabs
 # -----------------------------
-tab_interpret, tab_library = st.tabs(["Interpret", "Library"])
+tab_interpret, tab_history, tab_library = st.tabs(["Interpret", "History", "Library"])
 
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def generate_interpretation(dream_text: str, style: str) -> str:
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": f"Selected school: {style}\n\nDream:\n{dream_text}"},
-        ],
-        temperature=0.8,
-        max_tokens=500,
+SESSION_LIMIT_NOTICE = "Whoa, that's a lot of dreams in a row! Give the dream machine a few seconds, then try again."
+
+
+def describe_api_error(e: Exception) -> str:
+    if isinstance(e, asyncio.TimeoutError):
+        return "This school took too long to answer. Please try again in a moment."
+    if isinstance(e, OverloadedError):
+        return (
+            "So many dreamers are visiting right now that our interpreter is fully booked. "
+            "Please try again in a minute or two."
+        )
+    if isinstance(e, CircuitOpenError):
+        return "Our dream engine is taking a short nap after a few hiccups. Please try again in a minute."
+    if is_quota_error(e):
+        return (
+            "OpenAI API quota exceeded for this API key. "
+            "Please add credits / enable billing on the OpenAI platform, then try again."
+        )
+    return f"Error calling OpenAI API: {e}"
+
+
+@st.cache_resource
+def get_interpretation_cache():
+    # Shared by every session in this process. Set DREAM_CACHE_PATH to a SQLite file
+    # to also share it across Streamlit worker processes.
+    return cache_from_env()
+
+
+@st.cache_resource
+def get_safety_filter():
+    # Answers crisis (and, opt-in, off-topic) inputs locally, before any API call
+    return safety_filter_from_env()
+
+
+def safety_check(dream_text: str):
+    safety = get_safety_filter()
+    return safety.check(dream_text) if safety is not None else None
+
+
+@st.cache_resource
+def get_router():
+    # Short, simple dreams go to the small model; long, detailed ones to the large one
+    return router_from_env()
+
+
+@st.cache_resource
+def get_fallback():
+    # Template interpretations from the symbol index, for timeouts, quota errors and an open circuit
+    if os.getenv("DREAM_FALLBACK", "1") != "1":
+        return None
+    return FallbackInterpreter()
+
+
+def fallback_interpretation(dream_text: str, style: str, reason):
+    fallback = get_fallback()
+    if fallback is None or reason is None:
+        return None
+    metrics.inc(
+        "dream_fallbacks_total",
+        help_text="Interpretations answered by the offline fallback instead of the API",
+        school=style,
+        reason=reason,
+    )
+    if trace_log is not None:
+        trace_log.write({"ts": time.time(), "school": style, "prompt_version": PROMPT_VERSION, "fallback": reason})
+    return fallback.interpret(dream_text, style)
+
+
+def session_fallback(reason):
+    request = st.session_state.get("interpretation_request")
+    if request is None:
+        return None
+    return fallback_interpretation(request["dream"], request["style"], reason)
+
+
+def interpretation_key(dream_text: str, style: str) -> str:
+    return make_key(dream_text, style, get_router().route(dream_text, style).model, PROMPT_VERSION)
+
+
+@st.cache_resource
+def get_semantic_cache():
+    # Opt-in: also answer reworded dreams ("flew above the ocean" ~ "flying over the sea")
+    if os.getenv("DREAM_SEMANTIC_CACHE", "0") != "1":
+        return None
+    return SemanticCache(
+        threshold=float(os.getenv("DREAM_SEMANTIC_THRESHOLD", "0.8")),
+        max_entries=int(os.getenv("DREAM_SEMANTIC_MAX_ENTRIES", "2000")),
+        ttl_seconds=float(os.getenv("DREAM_CACHE_TTL", str(24 * 3600))),
+        path=os.getenv("DREAM_SEMANTIC_CACHE_PATH"),
+        namespace=PROMPT_VERSION,
+    )
+
+
+def semantic_index(dream_text: str, style: str) -> str:
+    # One index per school and routed model, so an answer only stands in for its own model's
+    return f"{style}/{get_router().route(dream_text, style).model}"
+
+
+def cached_interpretation(dream_text: str, style: str):
+    # Exact match first, then the closest earlier dream for this school
+    text = get_interpretation_cache().get(interpretation_key(dream_text, style))
+    semantic = get_semantic_cache()
+    if text is None and semantic is not None:
+        found = semantic.lookup(dream_text, semantic_index(dream_text, style))
+        if found is not None:
+            text, similarity = found
+            metrics.observe(
+                "dream_semantic_similarity",
+                similarity,
+                "Similarity of semantic cache hits",
+                buckets=(0.8, 0.85, 0.9, 0.95, 0.99, 1.0),
+            )
+    return text
+
+
+def cache_writer(dream_text: str, style: str):
+    # on_success callback for jobs; resolves the caches here because it runs on a job thread
+    cache, semantic = get_interpretation_cache(), get_semantic_cache()
+    key = interpretation_key(dream_text, style)
+    index = semantic_index(dream_text, style)
+
+    def store(text):
+        cache.put(key, text)
+        if semantic is not None:
+            semantic.add(dream_text, index, text)
+
+    return store
+
+
+@st.cache_resource
+def get_popularity_store():
+    # Clicks from every session (and, with DREAM_POPULARITY_PATH, every worker process)
+    path = os.getenv("DREAM_POPULARITY_PATH", ":memory:")
+    return PopularityStore(
+        path,
+        compact_interval=float(os.getenv("DREAM_POPULARITY_COMPACT_INTERVAL", "300")),
+        refresh_interval=float(os.getenv("DREAM_POPULARITY_REFRESH_INTERVAL", "30")),
     )
-    return resp.choices[0].message.content.strip()
 
 
-def get_ordered_styles(exclude=None):
-    counts = st.session_state.click_counts
-    styles = list(counts.keys())
+def get_ordered_styles(styles, exclude=None):
+    counts = get_popularity_store().snapshot()
 
     if exclude:
         styles = [s for s in styles if s != exclude]
 
     # If all are 0 clicks, random order for variety
-    if all(v == 0 for v in counts.values()):
+    if all(counts.get(s, 0) == 0 for s in styles):
         return random.sample(styles, len(styles))
 
     # Otherwise sort by most-clicked first
     return sorted(styles, key=lambda s: counts.get(s, 0), reverse=True)
 
-def full_reset():
-    st.session_state.clear()
-    st.rerun()
+@st.cache_resource
+def get_history_store():
+    # Every user's past interpretations; DREAM_HISTORY=0 keeps nothing
+    if os.getenv("DREAM_HISTORY", "1") != "1":
+        return None
+    return HistoryStore(os.getenv("DREAM_HISTORY_PATH", "dream_history.db"))
 
 
+USER_COOKIE = "dream_uid"
 
-# -----------------------------
-# Session state init
-# -----------------------------
-if "click_counts" not in st.session_state:
-    st.session_state.click_counts = {
-        "Ancient Egyptian": 0,
-        "Ancient Greek Oneiromancy": 0,
-        "Biblical/Early Christian": 0,
-        "Hindu/Vedic": 0,
-        "Nordic/Norse": 0,
-        "Native American/Indigenous": 0,
-        "Freudian/Psychoanalytic": 0,
-        "Jungian Analytical Psychology": 0,
-        "Gestalt": 0,
-        "Cognitive/Neuroscientific": 0,
-        "Existential/Humanistic": 0,
-    }
 
-if "interpretation_done" not in st.session_state:
-    st.session_state.interpretation_done = False
-if "selected_style" not in st.session_state:
-    st.session_state.selected_style = None
-if "interpreting" not in st.session_state:
-    st.session_state.interpreting = False
-if "interpretation_start_time" not in st.session_state:
-    st.session_state.interpretation_start_time = None
-if "interpretation_text" not in st.session_state:
-    st.session_state.interpretation_text = None
+def user_id() -> str:
+    # Whoever holds this id can read the history, so it lives in a cookie, never in the page URL
+    state = st.session_state
+    if "user_id" not in state:
+        state.user_id = st.context.cookies.get(USER_COOKIE) or uuid.uuid4().hex
+    return state.user_id
 
 
-# -----------------------------
-# Interpret tab (main app)
-# -----------------------------
-with tab_interpret:
-    dream_text = st.text_area(
-        "",
-        height=90,
-        key="dreaminput",
-        placeholder="Describe your dream...",
-        label_visibility="collapsed",
+def keep_user_id():
+    # Streamlit can read cookies but not set them; the browser sets it from a zero-size frame
+    if get_history_store() is None or st.context.cookies.get(USER_COOKIE) == user_id():
+        return
+    components.html(
+        f"<script>window.parent.document.cookie = "
+        f"'{USER_COOKIE}={user_id()}; path=/; max-age=31536000; SameSite=Strict';</script>",
+        height=0,
+        width=0,
     )
 
-    if not st.session_state.interpretation_done:
-        ancientstyles = [
-            "Ancient Egyptian",
-            "Ancient Greek Oneiromancy",
-            "Biblical/Early Christian",
-            "Hindu/Vedic",
-            "Nordic/Norse",
-            "Native American/Indigenous",
-        ]
-        modernstyles = [
-            "Freudian/Psychoanalytic",
-            "Jungian Analytical Psychology",
-            "Gestalt",
-            "Cognitive/Neuroscientific",
-            "Existential/Humanistic",
-        ]
-
-        #ordered = getorderedstyles()
-        #ordered_ancient = [s for s in ordered if s in ancientstyles]
-        #ordered_modern = [s for s in ordered if s in modernstyles]
-        styles = ["General"] + ancientstyles + modernstyles
-
-        current = st.session_state.selected_style or "General"
-        if current not in styles:
-            current = "General"
-
-        st.session_state.selectedstyle = st.selectbox(
-            "Choose an interpretation school",
-            options=styles,
-            key="selected_style",
-            index=styles.index(current),
+
+def remember_interpretation(text: str):
+    history = get_history_store()
+    request = st.session_state.get("interpretation_request")
+    if history is not None and request is not None:
+        history.record(user_id(), request["style"], request["dream"], text)
+        st.session_state.pop("history_rows", None)  # reload the History tab with it on top
+
+
+def earlier_interpretation(dream_text: str, style: str):
+    history = get_history_store()
+    if history is None or not dream_text.strip():
+        return None
+    return history.find(user_id(), style, dream_text)
+
+
+def reuse_interpretation(text: str):
+    # on_click: show the user's own earlier answer instead of generating again
+    if current_phase(st.session_state) != IDLE:
+        return
+    cancel_speculation()
+    metrics.inc("dream_history_reuse_total", help_text="Interpret flows answered from the user's own history")
+    transition(st.session_state, DONE, interpretation_text=text)
+
+
+@st.cache_resource
+def get_job_executor():
+    # One pool for the whole process, so in-flight requests don't pin Streamlit script threads
+    admission = AdmissionController(
+        requests_per_minute=int(os.getenv("DREAM_REQUESTS_PER_MINUTE", "60")),
+        tokens_per_minute=int(os.getenv("DREAM_TOKENS_PER_MINUTE", "90000")),
+        session_requests_per_minute=int(os.getenv("DREAM_SESSION_REQUESTS_PER_MINUTE", "4")),
+        max_queue=int(os.getenv("DREAM_MAX_QUEUE", "50")),
+        max_wait=float(os.getenv("DREAM_MAX_QUEUE_WAIT", "60")),
+    )
+    return JobExecutor(
+        max_workers=int(os.getenv("DREAM_JOB_WORKERS", "8")),
+        admission=admission,
+        max_speculative=int(os.getenv("DREAM_SPECULATE_MAX_IN_FLIGHT", "4")),
+    )
+
+
+@st.cache_resource
+def get_metrics(_cache, _executor, _prompt_usage, _popularity, _semantic, _history):
+    # Exported on DREAM_METRICS_PORT for a Prometheus scraper, or written as an OpenMetrics
+    # text file to DREAM_METRICS_FILE when there is no scraper
+    metrics = Metrics()
+    metrics.gauge("dream_cache_entries", lambda: _cache.stats()["entries"], "Entries in the interpretation cache")
+    metrics.gauge(
+        "dream_cache_events",
+        lambda: [({"event": k}, v) for k, v in _cache.stats().items() if k != "entries"],
+        "Interpretation cache hits, misses and evictions",
+    )
+    if _history is not None:
+        metrics.gauge(
+            "dream_history_events",
+            lambda: [({"state": k}, v) for k, v in _history.stats().items()],
+            "History rows waiting for, written to or dropped by the history store",
+        )
+    if _semantic is not None:
+        metrics.gauge(
+            "dream_semantic_cache",
+            lambda: [({"event": k}, v) for k, v in _semantic.stats().items()],
+            "Semantic cache entries, hits, misses and evictions",
+        )
+    metrics.gauge("dream_jobs_running", lambda: _executor.stats()["running"], "Interpretation jobs queued or running")
+    metrics.gauge(
+        "dream_job_callback_errors",
+        lambda: _executor.stats()["callback_errors"],
+        "Finished jobs whose on_success hook (cache writes) raised; the answer was still shown",
+    )
+    metrics.gauge(
+        "dream_speculative_jobs_running",
+        lambda: _executor.stats()["speculative"],
+        "Speculative jobs waiting out their delay or generating, not adopted yet",
+    )
+    metrics.gauge(
+        "dream_upstream_calls",
+        lambda: [({"kind": k}, v) for k, v in _executor.stats().items() if k in ("calls", "deduplicated")],
+        "Upstream calls started vs. requests that joined one already in flight",
+    )
+    metrics.gauge(
+        "dream_admission",
+        lambda: [({"event": k}, v) for k, v in _executor.admission.stats().items()],
+        "Admission controller counters and current queue length",
+    )
+    metrics.gauge(
+        "dream_prompt_tokens",
+        lambda: [
+            ({"kind": k}, v)
+            for k, v in _prompt_usage.stats().items()
+            if k in ("prompt_tokens", "cached_prompt_tokens", "completion_tokens")
+        ],
+        "Tokens reported by the API, including prompt tokens served from the provider cache",
+    )
+    metrics.gauge(
+        "dream_popularity_events",
+        lambda: [({"state": k}, v) for k, v in _popularity.stats().items() if k != "compactions"],
+        "School clicks waiting for, written to or dropped by the popularity store",
+    )
+
+    def school_clicks():
+        # Every school in the registry, including the ones nobody has clicked yet
+        counts = _popularity.snapshot()
+        return [({"school": s}, counts.get(s, 0)) for s in REGISTRY.interpreting()]
+
+    metrics.gauge("dream_school_clicks", school_clicks, "Clicks per school across sessions")
+
+    port = os.getenv("DREAM_METRICS_PORT")
+    path = os.getenv("DREAM_METRICS_FILE")
+    if port:
+        start_http_exporter(metrics, int(port))
+    elif path:
+        start_file_exporter(metrics, path, interval=float(os.getenv("DREAM_METRICS_INTERVAL", "15")))
+    return metrics
+
+
+@st.cache_resource
+def get_trace_log():
+    path = os.getenv("DREAM_TRACE_FILE")
+    return TraceLog(path) if path else None
+
+
+def record_interpretation(style, cache_hit, job=None, usage=None, route=None, preview=None):
+    # Called from job threads as well, so only touch objects resolved on the script thread
+    model = route.model if route is not None else MODEL
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cost = estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+    error_class = type(job.error).__name__ if job is not None and job.error is not None else None
+
+    outcome = "cache_hit" if cache_hit else ("error" if error_class else "ok")
+    metrics.inc("dream_interpretations_total", help_text="Interpretations by school and outcome", school=style, outcome=outcome)
+    trace = {
+        "ts": time.time(),
+        "school": style,
+        "model": model,
+        "prompt_version": PROMPT_VERSION,
+        "cache_hit": cache_hit,
+        "error_class": error_class,
+    }
+    if job is not None:
+        queue_wait = (job.started_at or job.finished_at) - job.created_at
+        ttft = job.first_token_at - job.created_at if job.first_token_at else None
+        total = job.finished_at - job.created_at
+        metrics.observe("dream_queue_wait_seconds", queue_wait, "Time jobs waited for admission and a worker")
+        if ttft is not None:
+            metrics.observe(
+                "dream_time_to_first_token_seconds", ttft, "Submit to first streamed token", school=style, model=model
+            )
+        metrics.observe("dream_generation_seconds", total, "Submit to finished interpretation", school=style, model=model)
+        if cost:
+            metrics.inc("dream_cost_usd_total", cost, "Estimated API spend in USD", school=style, model=model)
+        if error_class:
+            metrics.inc("dream_errors_total", help_text="Failed interpretations by error class", error_class=error_class)
+        trace.update(
+            job_id=job.id,
+            queue_wait_s=round(queue_wait, 4),
+            ttft_s=round(ttft, 4) if ttft is not None else None,
+            total_s=round(total, 4),
+            prompt_tokens=prompt_tokens,
+            cached_tokens=cached_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=round(cost, 6),
+        )
+    if route is not None and job is not None:
+        metrics.inc(
+            "dream_routes_total",
+            help_text="Generated interpretations by routing tier and reason",
+            tier=route.tier,
+            reason=route.reason,
+            model=model,
         )
+        trace.update(route_tier=route.tier, route_reason=route.reason, max_tokens=route.max_tokens)
+        if preview is not None:
+            preview_ttft = preview.first_token_at - preview.created_at if preview.first_token_at else None
+            trace.update(
+                preview_status=preview.status,
+                preview_ttft_s=round(preview_ttft, 4) if preview_ttft is not None else None,
+            )
+    if trace_log is not None:
+        trace_log.write(trace)
 
-        if st.button("Interpret", use_container_width=True):
-            if st.session_state.selectedstyle and st.session_state.selectedstyle != "General":
-                st.session_state.click_counts[st.session_state.selectedstyle] += 1
 
-            st.session_state.interpreting = True
-            st.session_state.interpretationstarttime = time.time()
-            st.session_state.interpretationtext = None
-            st.rerun()
+def estimate_tokens(dream_text: str, max_tokens=MAX_TOKENS) -> int:
+    # Rough prompt size (~4 characters per token) plus the completion budget
+    return (len(SYSTEM_PROMPT) + len(dream_text)) // 4 + max_tokens
 
-    else:
-        if st.button("Interpret another dream", use_container_width=True):
-            full_reset()
-        st.session_state.pop("dream_input", None)  # remove widget value safely
-        
 
+def session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
 
 
-    # Loading + generation (only if a dream is present)
-    if st.session_state.get("interpreting", False) and dream_text.strip():
-        if st.session_state.interpretation_start_time is None:
-            st.session_state.interpretation_start_time = time.time()
+def finish_interpretation(phase: str, text: str, remember=True):
+    # The one rerun of an interpretation that no user caused: a full run re-renders the
+    # Interpret tab with the result and is what stops the progress fragment's polling
+    if phase == DONE and remember:
+        remember_interpretation(text)
+    get_job_executor().cancel(st.session_state.get("interpretation_preview_job_id"))
+    transition(
+        st.session_state, phase, interpretation_text=text, interpretation_job_id=None, interpretation_preview_job_id=None
+    )
+    st.rerun()
 
-        elapsed = time.time() - st.session_state.interpretation_start_time
 
-        st.markdown(
-            """
+@st.fragment(run_every=0.5)
+def show_interpretation_progress():
+    if current_phase(st.session_state) not in (QUEUED, GENERATING):
+        return  # a late poll after the full rerun that ended this interpretation
+    metrics.inc("dream_progress_polls_total", help_text="Fragment reruns polling an interpretation job")
+    job = get_job_executor().get(st.session_state.get("interpretation_job_id"))
+    if job is None:
+        finish_interpretation(ERROR, "This interpretation expired before it could be shown. Please try again.")
+    phase = phase_for_job(job)
+    if phase == DONE:
+        finish_interpretation(DONE, job.text)
+    if phase == ERROR:
+        fallback = session_fallback(fallback_reason(job.error))
+        if fallback is not None:
+            finish_interpretation(DONE, fallback, remember=False)  # not a real answer; keep it out of history
+        finish_interpretation(ERROR, describe_api_error(job.error))
+    if phase != current_phase(st.session_state):
+        transition(st.session_state, phase)
+
+    # Stream whatever has arrived so far; a quick preview stands in until the full text is longer
+    text = job.partial_text
+    preview = get_job_executor().get(st.session_state.get("interpretation_preview_job_id"))
+    if preview is not None:
+        if len(preview.partial_text) > len(text):
+            st.caption("A quick first look while the full interpretation is being written...")
+            st.write(preview.partial_text)
+            return
+        if text:
+            get_job_executor().cancel(preview.id)  # overtaken; it will not be shown again
+            st.session_state.interpretation_preview_job_id = None
+    if text:
+        st.write(text)
+        return
+
+    # Nothing yet after DREAM_FALLBACK_TIMEOUT: answer from the symbol index. The job keeps running
+    # and caches its result, so asking again later gets the full interpretation.
+    if job.elapsed() > float(os.getenv("DREAM_FALLBACK_TIMEOUT", "20")):
+        fallback = session_fallback("timeout")
+        if fallback is not None:
+            finish_interpretation(DONE, fallback, remember=False)
+
+    # Until the first token, show the zzz loader
+    st.markdown(
+        """
 <div class="zzz-container">
   <div class="zzz-breathe" aria-label="loading">
     <span style="--i:0; --s:0.72;">z</span>
@@ -347,175 +646,530 @@ with tab_interpret:
   </div>
 </div>
 """,
+        unsafe_allow_html=True,
+    )
+
+    position = get_job_executor().position(job.id) if job.status == "queued" else 0
+    if position:
+        st.markdown(
+            f'<div class="slow-server-msg">You\'re in line (#{position}). Lots of dreamers tonight, your turn is coming!</div>',
+            unsafe_allow_html=True,
+        )
+    elif job.elapsed() > 10:
+        st.markdown(
+            '<div class="slow-server-msg">Our AI is lost in a deep dream coma... even Freud needs coffee sometimes!</div>',
             unsafe_allow_html=True,
         )
 
-        if elapsed > 10:
-            st.markdown(
-                '<div class="slow-server-msg">Our AI is lost in a deep dream coma... even Freud needs coffee sometimes!</div>',
-                unsafe_allow_html=True,
+
+def start_compare():
+    # on_click callback: answers what it can at once and starts one job per remaining school.
+    # The jobs share the pool, the admission line and the budgets with Interpret jobs, and an
+    # identical running request (or speculation) is joined instead of repeated.
+    state = st.session_state
+    dream_text = state.get("dream_input", "")
+    styles = list(state.get("compare_styles") or [])
+    if not dream_text.strip() or not styles:
+        return
+    flagged = safety_check(dream_text)
+    compare = state.compare = {"dream": dream_text, "styles": styles, "results": {}, "jobs": {}}
+    pending = []
+    for style in styles:
+        cached = flagged.reply if flagged is not None else cached_interpretation(dream_text, style)
+        if cached is not None:
+            compare["results"][style] = cached
+        else:
+            pending.append(style)
+
+    executor = get_job_executor()
+    if pending and not executor.admission.allow_session(session_id()):
+        compare["results"].update(dict.fromkeys(pending, SESSION_LIMIT_NOTICE))
+        return
+    router = get_router()
+    for style in pending:
+        route = router.route(dream_text, style)
+        usage = {}
+        try:
+            compare["jobs"][style] = executor.submit(
+                interpreter.interpret_stream,
+                dream_text=dream_text,
+                style=style,
+                on_usage=lambda u, usage=usage: usage.update(usage=u),
+                key=interpretation_key(dream_text, style),
+                cost=estimate_tokens(dream_text, route.max_tokens),
+                on_success=cache_writer(dream_text, style),
+                on_finish=lambda job, style=style, usage=usage, route=route: record_interpretation(
+                    style, False, job, usage.get("usage"), route
+                ),
+                **route.params(),
+            )
+        except OverloadedError as e:
+            compare["results"][style] = describe_api_error(e)
+
+
+def compare_outcome(dream_text: str, style: str, job):
+    # The text a finished (or given up on) school's tab keeps, or None while it is still coming
+    if job is None:
+        return "This interpretation expired before it could be shown. Please try again."
+    phase = phase_for_job(job)
+    if phase == DONE:
+        return job.text
+    if phase == ERROR:
+        return fallback_interpretation(dream_text, style, fallback_reason(job.error)) or describe_api_error(job.error)
+    if not job.partial_text and job.elapsed() > float(os.getenv("DREAM_COMPARE_TIMEOUT", "60")):
+        # Like Interpret's fallback: the job keeps running and caches its answer for next time
+        return fallback_interpretation(dream_text, style, "timeout") or describe_api_error(asyncio.TimeoutError())
+    return None
+
+
+@st.fragment(run_every=0.5)
+def show_compare_progress():
+    compare = st.session_state.get("compare")
+    if compare is None or not compare["jobs"]:
+        return  # a late poll after the full rerun that ended this comparison
+    executor = get_job_executor()
+    for style, job_id in list(compare["jobs"].items()):
+        text = compare_outcome(compare["dream"], style, executor.get(job_id))
+        if text is not None:
+            compare["results"][style] = text
+            del compare["jobs"][style]
+    if not compare["jobs"]:
+        st.rerun()  # one full rerun shows every answer and stops the polling
+    render_compare(compare)
+
+
+def render_compare(compare: dict):
+    executor = get_job_executor()
+    for style, tab in zip(compare["styles"], st.tabs(compare["styles"])):
+        if style in compare["results"]:
+            tab.write(compare["results"][style])
+            continue
+        job = executor.get(compare["jobs"][style])
+        position = executor.position(job.id) if job is not None and job.status == "queued" else 0
+        if job is not None and job.partial_text:
+            tab.write(job.partial_text)
+        elif position:
+            tab.caption(f"In line (#{position})...")
+        else:
+            tab.caption("Dreaming...")
+
+
+def start_interpretation():
+    # on_click callback: runs before the script, so the same run already renders the new phase
+    state = st.session_state
+    dream_text = state.get("dream_input", "")
+    if current_phase(state) != IDLE or not dream_text.strip():
+        return
+    flagged = safety_check(dream_text)
+    if flagged is not None:
+        cancel_speculation()
+        metrics.inc(
+            "dream_safety_replies_total",
+            help_text="Inputs answered by the local safety filter without an API call",
+            category=flagged.category,
+            reason=flagged.reason,
+        )
+        transition(state, DONE, interpretation_text=flagged.reply)
+        return
+    executor = get_job_executor()
+    if not executor.admission.allow_session(session_id()):
+        state.admission_notice = True
+        return
+
+    style = state.get("selected_style") or DEFAULT_SCHOOL
+    if style in REGISTRY.interpreting():
+        get_popularity_store().record(style)
+    state.interpretation_request = {"dream": dream_text, "style": style}
+
+    # A speculative job for this dream and school may already be running (or done and cached)
+    speculated = take_speculation(dream_text, style)
+    if speculated is not None and executor.adopt(speculated):
+        job = executor.get(speculated)
+        metrics.inc(
+            "dream_speculation_adopted_total",
+            help_text="Interpret clicks served by a speculative job",
+            state="finished" if job.finished else "in_flight",
+        )
+        if not job.finished:
+            transition(state, QUEUED, interpretation_job_id=speculated)
+        else:
+            record_interpretation(style, cache_hit=True)  # already paid for, like a cache hit
+            remember_interpretation(job.text)
+            transition(state, DONE, interpretation_text=job.text)
+        return
+
+    # Sessions asking for the same dream + school at the same time share one job
+    cached = cached_interpretation(dream_text, style)
+    if cached is not None:
+        record_interpretation(style, cache_hit=True)
+        remember_interpretation(cached)
+        transition(state, DONE, interpretation_text=cached)
+        return
+
+    route = get_router().route(dream_text, style)
+    preview_id = start_preview(dream_text, style, route)
+    usage = {}
+    try:
+        job_id = executor.submit(
+            interpreter.interpret_stream,
+            dream_text=dream_text,
+            style=style,
+            on_usage=lambda u: usage.update(usage=u),
+            key=interpretation_key(dream_text, style),
+            cost=estimate_tokens(dream_text, route.max_tokens),
+            on_success=cache_writer(dream_text, style),
+            on_finish=lambda job: record_interpretation(
+                style, False, job, usage.get("usage"), route, executor.get(preview_id)
+            ),
+            **route.params(),
+        )
+    except OverloadedError as e:
+        executor.cancel(preview_id)
+        transition(state, ERROR, interpretation_text=describe_api_error(e))
+        return
+    transition(
+        state,
+        QUEUED,
+        interpretation_job_id=job_id,
+        interpretation_preview_job_id=preview_id,
+    )
+
+
+def start_preview(dream_text: str, style: str, route):
+    """
+    Opt-in (DREAM_PREVIEW=1): a short draft from the small model, shown until the full
+    interpretation is longer. It runs like a speculative job: only if there is spare
+    capacity right now, and it can be cancelled once it is no longer needed.
+    """
+    preview = get_router().preview_route(route)
+    if preview is None:
+        return None
+    usage = {}
+    return get_job_executor().submit(
+        interpreter.interpret_stream,
+        dream_text=dream_text,
+        style=style,
+        on_usage=lambda u: usage.update(usage=u),
+        cost=estimate_tokens(dream_text, preview.max_tokens),
+        on_finish=lambda job: finish_preview(preview, dream_text, job, usage.get("usage")),
+        speculative=True,
+        **preview.params(),
+    )
+
+
+def finish_preview(route, dream_text, job, usage):
+    # Runs on the job thread
+    metrics.inc("dream_previews_total", help_text="Quick previews by how they ended", status=job.status)
+    cost = partial_cost(route.model, dream_text, job, usage)
+    if cost:
+        metrics.inc("dream_preview_cost_usd_total", cost, "Estimated spend on quick previews")
+
+
+def speculation_enabled() -> bool:
+    return os.getenv("DREAM_SPECULATE", "0") == "1"
+
+
+def speculate(dream_text: str, selected: str):
+    """
+    Opt-in (DREAM_SPECULATE=1): start generating while the user is still choosing, for the
+    selected school and the most clicked other schools. Jobs wait DREAM_SPECULATE_DELAY
+    seconds before calling the API, so a dream that is still being edited costs nothing.
+    """
+    state = st.session_state
+    if not speculation_enabled() or current_phase(state) != IDLE or not dream_text.strip():
+        return
+    if safety_check(dream_text) is not None:
+        cancel_speculation()
+        return
+    dream = normalize_dream(dream_text)
+    speculation = state.get("speculation")
+    if speculation is None or speculation["dream"] != dream:
+        cancel_speculation()
+        speculation = state.speculation = {"dream": dream, "jobs": {}}
+
+    counts = get_popularity_store().snapshot()
+    popular = [s for s in sorted(counts, key=counts.get, reverse=True) if s != selected]
+    schools = [selected] + popular[: int(os.getenv("DREAM_SPECULATE_SCHOOLS", "2"))]
+    executor = get_job_executor()
+    router = get_router()
+    per_dream = int(os.getenv("DREAM_SPECULATE_MAX_PER_DREAM", "4"))
+    for style in schools:
+        if style in speculation["jobs"]:
+            continue
+        if len(speculation["jobs"]) >= per_dream:
+            break
+        if cached_interpretation(dream_text, style) is not None:
+            speculation["jobs"][style] = None  # nothing to generate; the click will hit the cache
+            continue
+        route = router.route(dream_text, style)
+        usage = {}
+        job_id = executor.submit(
+            interpreter.interpret_stream,
+            dream_text=dream_text,
+            style=style,
+            on_usage=lambda u, usage=usage: usage.update(usage=u),
+            key=interpretation_key(dream_text, style),
+            cost=estimate_tokens(dream_text, route.max_tokens),
+            on_success=cache_writer(dream_text, style),
+            on_finish=lambda job, style=style, usage=usage, route=route: finish_speculation(
+                style, dream_text, job, usage.get("usage"), route
+            ),
+            speculative=True,
+            delay=float(os.getenv("DREAM_SPECULATE_DELAY", "2")),
+            **route.params(),
+        )
+        if job_id is None:
+            break  # process-wide cap reached
+        speculation["jobs"][style] = job_id
+
+
+def take_speculation(dream_text: str, style: str):
+    # On click: keep the job for the chosen school (if it is for this dream), cancel the rest
+    speculation = st.session_state.get("speculation")
+    job_id = None
+    if speculation is not None and speculation["dream"] == normalize_dream(dream_text):
+        job_id = speculation["jobs"].pop(style, None)
+    cancel_speculation()
+    return job_id
+
+
+def cancel_speculation():
+    speculation = st.session_state.pop("speculation", None)
+    if not speculation:
+        return
+    executor = get_job_executor()
+    for job_id in speculation["jobs"].values():
+        if job_id is not None and executor.cancel(job_id):
+            metrics.inc("dream_speculation_cancelled_total", help_text="Speculative jobs cancelled before finishing")
+
+
+def finish_speculation(style, dream_text, job, usage, route):
+    # Runs on the job thread. An adopted job is an ordinary interpretation from then on.
+    if not job.speculative:
+        record_interpretation(style, False, job, usage, route)
+        return
+    metrics.inc(
+        "dream_speculative_jobs_total",
+        help_text="Speculative jobs that ended before anyone adopted them, by status",
+        status=job.status,
+    )
+    cost = partial_cost(route.model, dream_text, job, usage)
+    if cost:
+        metrics.inc("dream_speculative_cost_usd_total", cost, "Estimated spend on speculative jobs before adoption")
+
+
+def partial_cost(model, dream_text, job, usage) -> float:
+    # Spend on a job that may have been cancelled before it finished
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage.prompt_tokens or 0, usage.completion_tokens or 0
+    elif job.started_at is not None:
+        # Cancelled mid-stream, so there is no usage report; estimate at ~4 characters per token
+        prompt_tokens = (len(SYSTEM_PROMPT) + len(dream_text)) // 4
+        completion_tokens = len(job.partial_text) // 4
+    else:
+        return 0.0
+    return estimate_cost(model, prompt_tokens, 0, completion_tokens)
+
+
+def reset_interpretation():
+    cancel_speculation()
+    clear_interpretation(st.session_state)
+    st.session_state.dream_input = ""
+    st.session_state.pop("compare", None)
+    st.session_state.pop("school_order", None)
+
+
+
+# -----------------------------
+# Shared resources
+# -----------------------------
+metrics = get_metrics(
+    get_interpretation_cache(),
+    get_job_executor(),
+    prompt_usage,
+    get_popularity_store(),
+    get_semantic_cache(),
+    get_history_store(),
+)
+trace_log = get_trace_log()
+metrics.inc(
+    "dream_script_runs_total",
+    help_text="Full script runs by interpret phase",
+    phase=current_phase(st.session_state),
+)
+
+
+# -----------------------------
+# Interpret tab (main app)
+# -----------------------------
+# A fragment, so typing, picking a school and polling only rerun this tab
+@st.fragment
+def interpret_tab():
+    dream_text = st.text_area(
+        "Describe your dream",
+        height=90,
+        key="dream_input",
+        placeholder="Describe your dream...",
+        label_visibility="collapsed",
+    )
+    phase = current_phase(st.session_state)
+
+    if phase in (DONE, ERROR):
+        st.button("Interpret another dream", use_container_width=True, on_click=reset_interpretation)
+    else:
+        ancientstyles = REGISTRY.names("ancient")
+        modernstyles = REGISTRY.names("modern")
+
+        # Most popular first; fixed per session (until reset) so the options don't move under the user
+        if "school_order" not in st.session_state:
+            st.session_state.school_order = get_ordered_styles(ancientstyles + modernstyles)
+        ordered = st.session_state.school_order
+        ordered_ancient = [s for s in ordered if s in ancientstyles]
+        ordered_modern = [s for s in ordered if s in modernstyles]
+        styles = REGISTRY.names("general") + ordered_ancient + ordered_modern
+
+        st.selectbox("Choose an interpretation school", options=styles, key="selected_style")
+        speculate(dream_text, st.session_state.selected_style)
+
+        earlier = earlier_interpretation(dream_text, st.session_state.selected_style)
+        if earlier is not None:
+            st.info("You already interpreted this dream with this school.")
+            st.button(
+                "Show my earlier interpretation",
+                use_container_width=True,
+                on_click=reuse_interpretation,
+                args=(earlier,),
             )
 
-        
-        # Only call once per run; store in session_state so reruns don't re-call the API
-        if st.session_state.interpretation_text is None:
-            try:
-                st.session_state.interpretation_text = generate_interpretation(
-                    dream_text=dream_text,
-                    style=st.session_state.selected_style or "General",
-                )
-            except Exception as e:
-                msg_api = str(e)
-                if "insufficient_quota" in msg_api:
-                    st.session_state.interpretation_text = (
-                        "OpenAI API quota exceeded for this API key. "
-                        "Please add credits / enable billing on the OpenAI platform, then try again."
-                    )
-                else:
-                    st.session_state.interpretation_text = f"Error calling OpenAI API: {e}"
-
-
-
-            st.session_state.interpretation_done = True
-            st.session_state.interpreting = False
-            st.rerun()
-
-    # Show the response once available
-    if st.session_state.get("interpretation_done", False) and st.session_state.get("interpretation_text"):
-      #  st.markdown("## Interpretation")
+        if st.session_state.pop("admission_notice", None):
+            st.warning(SESSION_LIMIT_NOTICE)
+
+        st.button("Interpret", use_container_width=True, on_click=start_interpretation)
+
+        with st.expander("Compare schools"):
+            st.multiselect(
+                "Schools to compare",
+                options=ancientstyles + modernstyles,
+                default=ancientstyles + modernstyles,
+                key="compare_styles",
+            )
+            st.button("Compare", use_container_width=True, on_click=start_compare)
+
+        # Poll the schools' jobs while any is running, like the Interpret job below
+        compare = st.session_state.get("compare")
+        if compare is not None and compare["jobs"]:
+            show_compare_progress()
+        elif compare is not None:
+            render_compare(compare)
+
+    # Poll the background job while it runs; otherwise show the outcome in place
+    if phase in (QUEUED, GENERATING):
+        show_interpretation_progress()
+    elif phase == DONE:
         st.write(st.session_state.interpretation_text)
+    elif phase == ERROR:
+        st.error(st.session_state.interpretation_text)
 
     # Helpful error if key missing
     if not os.getenv("OPENAI_API_KEY"):
         st.warning("OPENAI_API_KEY is not set. Set it in your environment before running Streamlit.")
 
-# -----------------------------
-# Library tab
-# -----------------------------
-with tab_library:
-    st.markdown("## Dream Interpretation Library")
-    st.caption("Origins and brief history of each interpretation approach used in this app.")
 
-    st.markdown("### Ancient Egyptian")
-    st.write(
-        "Ancient Egyptian dream interpretation is among the earliest recorded traditions, closely tied to temple life and religious practice. "
-        "Dreams were often treated as messages or signs mediated by gods, the dead, or protective spirits, and they could be consulted for guidance "
-        "about health, decisions, and ritual obligations."
-    )
-    st.write(
-        "Historically, surviving evidence suggests organized methods for reading dreams, including catalog-like approaches that associated specific "
-        "dream images with favorable or unfavorable outcomes. These traditions influenced later Mediterranean dream lore and helped establish the idea "
-        "that dreams can be “read” using shared cultural symbols rather than purely personal meanings."
-    )
+with tab_interpret:
+    interpret_tab()
 
-    st.markdown("### Ancient Greek Oneiromancy")
-    st.write(
-        "In ancient Greece, oneiromancy (divination through dreams) developed alongside broader practices of prophecy and temple healing. "
-        "Dreams were often seen as communications from the divine, and they played a role in religious life as well as personal decision-making."
-    )
-    st.write(
-        "Over time, Greek writers and practitioners systematized dream interpretation into recognizable frameworks, distinguishing between symbolic dreams "
-        "and more direct “message” dreams. The tradition is strongly associated with later classical compilations that aimed to map common dream symbols to "
-        "likely outcomes in waking life."
-    )
+# -----------------------------
+# History tab
+# -----------------------------
+HISTORY_PAGE_SIZE = 20
 
-    st.markdown("### Biblical / Early Christian")
-    st.write(
-        "In Biblical and early Christian contexts, dreams are frequently presented as meaningful experiences that can carry divine instruction, warning, or comfort. "
-        "This approach typically treats the dream’s significance as connected to spiritual discernment, moral reflection, and the dreamer’s relationship to God."
-    )
-    st.write(
-        "Historically, early Christian thinkers inherited Jewish scriptural traditions while also responding to surrounding Greco-Roman dream practices. "
-        "Interpretation often emphasized humility and caution—valuing dreams as potentially meaningful while warning against obsession, manipulation, or pride."
-    )
 
-    st.markdown("### Hindu / Vedic")
-    st.write(
-        "Hindu and Vedic perspectives on dreams come from a broad, multi-text tradition that includes philosophical, spiritual, and sometimes medical viewpoints. "
-        "Dreams can be framed as reflections of the mind’s impressions (samskaras), karmic traces, and shifting states of consciousness."
-    )
-    st.write(
-        "Historically, Indian traditions explored dreaming in relation to waking and deep sleep, often using dreams to illustrate how perception and identity can change across states. "
-        "Some lineages treat certain dreams as spiritually instructive, while others focus on how dreams reveal attachments, fears, and patterns the practitioner can work with."
-    )
+def reset_history_view():
+    st.session_state.pop("history_rows", None)
 
-    st.markdown("### Nordic / Norse")
-    st.write(
-        "In Norse and broader Nordic traditions, dreams appear in sagas and folklore as meaningful signs—sometimes predictive, sometimes symbolic, and often socially significant. "
-        "Dreams could be interpreted as omens related to fate, family, voyages, conflicts, or major life turns."
-    )
-    st.write(
-        "Historically, these interpretations were shaped by oral storytelling cultures where memorable dream imagery could become part of communal narrative. "
-        "As the traditions were later written down, dream episodes often served as literary and cultural markers, reflecting values like courage, obligation, and destiny."
-    )
 
-    st.markdown("### Native American / Indigenous")
-    st.write(
-        "Many Indigenous cultures across North America have rich and diverse dream traditions, so there is no single unified “Native American” system. "
-        "However, dreams are often treated as experiences that can carry guidance, teaching, or relationship—sometimes involving ancestors, animals, or the land."
+def load_history_page():
+    # Keyset pagination: the next page starts below the oldest id already shown
+    state = st.session_state
+    rows = state.setdefault("history_rows", [])
+    school = state.get("history_school")
+    ids = [r["id"] for r in rows if r["id"] is not None]
+    page = get_history_store().page(
+        user_id(),
+        school=None if school == "All schools" else school,
+        search=state.get("history_search", ""),
+        before=ids[-1] if ids else None,
+        limit=HISTORY_PAGE_SIZE,
     )
-    st.write(
-        "Historically, approaches to dreams were embedded in community practices and responsibilities rather than abstract theory alone. "
-        "In many places, colonization and forced assimilation disrupted languages and ceremonial life, yet dream practices persist and continue to evolve within living communities."
+    rows.extend(page)
+    state.history_more = sum(r["id"] is not None for r in page) == HISTORY_PAGE_SIZE
+
+
+@st.fragment
+def history_tab():
+    st.markdown("## Your dream history")
+    if get_history_store() is None:
+        st.caption("History is turned off on this server.")
+        return
+    st.caption(
+        "Interpretations made in this browser. They are tied to a cookie, not to your account:"
+        " clearing cookies or switching browsers starts a new history."
     )
 
-    st.markdown("### Freudian / Psychoanalytic")
-    st.write(
-        "Freudian dream interpretation emerged in the late 19th and early 20th century as part of psychoanalysis. "
-        "It treats dreams as meaningful psychological productions, often shaped by hidden wishes, conflicts, and defenses."
+    search_col, school_col = st.columns([2, 1])
+    search_col.text_input(
+        "Search your dreams", key="history_search", on_change=reset_history_view, placeholder="wolf, ocean, teeth..."
     )
-    st.write(
-        "Historically, Freud popularized the idea that dreams have both a surface story and an underlying meaning shaped by the unconscious. "
-        "Later psychoanalytic schools expanded or challenged his claims, but the Freudian approach remains influential for framing dreams as expressions of inner conflict and desire."
+    school_col.selectbox(
+        "School", ["All schools"] + REGISTRY.names(), key="history_school", on_change=reset_history_view
     )
 
-    st.markdown("### Jungian / Analytical Psychology")
-    st.write(
-        "Jungian dream interpretation developed from Carl Jung’s analytical psychology, emphasizing symbols, personal growth, and the psyche’s drive toward balance. "
-        "Dreams are often viewed as compensations—showing what waking life overlooks—and as communications from deeper layers of the mind."
-    )
-    st.write(
-        "Historically, Jung expanded dream work beyond personal biography to include archetypal imagery found across myths, religions, and art. "
-        "This approach shaped much of modern symbolic dream culture and is still used in psychotherapy and reflective practices focused on meaning-making and individuation."
-    )
+    if "history_rows" not in st.session_state:
+        load_history_page()
+    rows = st.session_state.history_rows
+    if not rows and (st.session_state.get("history_search") or st.session_state.get("history_school") != "All schools"):
+        st.caption("No dreams match.")
+    elif not rows:
+        st.caption("Nothing here yet. Interpreted dreams will show up in this tab.")
+    for row in rows:
+        when = datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M")
+        title = row["dream"] if len(row["dream"]) <= 60 else row["dream"][:60] + "..."
+        with st.expander(f"{when} · {row['school']} · {title}"):
+            st.markdown(f"*{row['dream']}*")
+            st.write(row["interpretation"])
+    if st.session_state.get("history_more"):
+        st.button("Load more", use_container_width=True, on_click=load_history_page)
+
+
+with tab_history:
+    history_tab()
+keep_user_id()
 
-    st.markdown("### Gestalt")
-    st.write(
-        "Gestalt dream work arose from Gestalt therapy, which emphasizes present-moment experience, wholeness, and integrating parts of the self. "
-        "Rather than treating dream symbols as fixed codes, Gestalt invites the dreamer to “become” elements of the dream and speak from their perspective."
-    )
-    st.write(
-        "Historically, this approach grew in the mid-20th century as a reaction against overly intellectual or purely interpretive methods. "
-        "It made dream work more experiential and creative, using enactment and dialogue to help the dreamer reconnect with disowned feelings, needs, or strengths."
-    )
+# -----------------------------
+# Library tab
+# -----------------------------
+@st.cache_data
+def library_markdown() -> str:
+    # Built once per process; the tab sends it as a single markdown element
+    return REGISTRY.library_markdown()
 
-    st.markdown("### Cognitive / Neuroscientific")
-    st.write(
-        "Cognitive and neuroscientific views treat dreams as products of brain activity during sleep, shaped by memory, emotion, and perception systems. "
-        "Interpretation focuses less on prophecy and more on what dreaming may reveal about learning, stress, and the mind’s organization."
-    )
-    st.write(
-        "Historically, modern sleep research reframed dreaming through experiments on sleep stages, brain imaging, and cognitive models of memory consolidation. "
-        "While this school may be cautious about symbolic “certainties,” it supports the idea that dream themes can reflect current concerns and emotional processing."
-    )
 
-    st.markdown("### Existential / Humanistic")
-    st.write(
-        "Existential and humanistic approaches interpret dreams through meaning, values, freedom, and personal responsibility. "
-        "Dreams are often treated as emotional truths—showing what the person cares about, fears, avoids, or hopes to become."
-    )
-    st.write(
-        "Historically, these perspectives developed in the mid-20th century alongside therapies emphasizing authenticity and lived experience. "
-        "Dream work here tends to avoid rigid symbol dictionaries, instead exploring how the dream connects to choice, identity, relationships, and purpose."
-    )
+@st.fragment
+def library_tab():
+    st.markdown("## Dream Interpretation Library")
+    st.caption("Origins and brief history of each interpretation approach used in this app.")
+    st.markdown(library_markdown())
 
     st.divider()
 
     # Button to return user to the main page/tab.
     # NOTE: Streamlit does not reliably support programmatic tab switching across versions.
-    # This reruns the app and encourages the user to click "Interpret" if it doesn't auto-switch.
-    if st.button("Interpret my dream", use_container_width=True):
-        st.rerun()
+    # Clicking it only reruns this tab; the user still has to click "Interpret" to switch.
+    st.button("Interpret my dream", use_container_width=True)
+
+
+with tab_library:
+    library_tab()
 
 # -----------------------------
 # Buy me a coffee
@@ -0,0 +1,292 @@
+"""
+Bulk dream interpretation from the command line, with the same prompts and engine as the app.
+
+    python batch.py run dreams.jsonl -o results.jsonl --concurrency 16
+    python batch.py export dreams.csv -o batch_input.jsonl
+    python batch.py import batch_output.jsonl -o results.jsonl
+
+Input rows are JSON lines or CSV rows with a `dream` field, an optional `school` (default
+"General") and an optional `id` (default: the row number).
+
+`run` writes one JSON line per input row, in input order: {"id", "school", "interpretation"}
+or {"id", "school", "error"}; rows answered by the local safety filter (configured by the same
+DREAM_SAFETY_* variables as the app) also have "safety". At most 2 x concurrency rows are held
+in memory. Progress is checkpointed next to the output (<output>.ckpt), so running the same
+command again after an interruption continues after the last checkpointed row.
+
+`export` writes OpenAI Batch API request files (split at the API's per-file limits) and
+`import` turns Batch API output and error files back into result lines.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from engine import Interpreter, make_client, request_body
+from interpretation_cache import InterpretationCache, SqliteBackend, make_key
+from prompts import PROMPT_VERSION
+from routing import router_from_env
+from safety import safety_filter_from_env
+from schools import DEFAULT_SCHOOL, REGISTRY
+
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_BYTES = 190 * 1024 * 1024  # the API allows 200 MB per file
+
+
+# -----------------------------
+# Input / checkpoints
+# -----------------------------
+def read_rows(path):
+    """Yield (id, dream, school) tuples one at a time from a JSONL or CSV file."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if Path(path).suffix.lower() == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for index, record in enumerate(records):
+            row_id = record.get("id")
+            yield (
+                str(row_id) if row_id not in (None, "") else str(index),
+                record.get("dream") or "",
+                record.get("school") or DEFAULT_SCHOOL,
+            )
+
+
+def load_checkpoint(path, input_path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    if checkpoint["input"] != str(Path(input_path).resolve()):
+        raise SystemExit(f"{path} belongs to {checkpoint['input']}; pass --restart to start over")
+    return checkpoint["rows"], checkpoint["offset"]
+
+
+def save_checkpoint(path, input_path, rows, offset):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": str(Path(input_path).resolve()), "rows": rows, "offset": offset}, f)
+    os.replace(tmp, path)
+
+
+def write_line(f, record):
+    f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+# -----------------------------
+# run
+# -----------------------------
+def interpret_row(interpreter, router, cache, safety, row):
+    row_id, dream, school = row
+    result = {"id": row_id, "school": school}
+    if school not in REGISTRY:
+        result["error"] = f"unknown school: {school}"
+        return result, "error"
+    if not dream.strip():
+        result["error"] = "empty dream"
+        return result, "error"
+    flagged = safety.check(dream) if safety is not None else None
+    if flagged is not None:
+        result.update(interpretation=flagged.reply, safety=flagged.category)
+        return result, "filtered"
+    # Same model choice and school params as the app, so a shared cache file holds the same keys
+    route = router.route(dream, school)
+    key = make_key(dream, school, route.model, PROMPT_VERSION)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        result["interpretation"] = cached
+        return result, "cached"
+    try:
+        text = interpreter.interpret(dream, school, **route.params())
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result, "error"
+    if cache is not None:
+        cache.put(key, text)
+    result["interpretation"] = text
+    return result, "ok"
+
+
+def run(args):
+    checkpoint_path = args.checkpoint or f"{args.output}.ckpt"
+    done, offset = (0, 0) if args.restart else load_checkpoint(checkpoint_path, args.input)
+    interpreter = Interpreter(make_client(), max_attempts=args.retries)
+    router = router_from_env()
+    safety = None if args.no_safety_filter else safety_filter_from_env()
+    cache = None
+    if args.cache:
+        cache = InterpretationCache(SqliteBackend(args.cache, max_entries=args.cache_max_entries))
+
+    if done and (not os.path.exists(args.output) or os.path.getsize(args.output) < offset):
+        raise SystemExit(f"{args.output} is shorter than its checkpoint; pass --restart to start over")
+
+    counts = {"ok": 0, "cached": 0, "filtered": 0, "error": 0}
+    written = 0
+    interrupted = False
+    started = time.perf_counter()
+    out = open(args.output, "ab" if done else "wb")
+    out.truncate(offset)  # drop anything written after the last checkpoint
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="dream-batch")
+
+    def commit():
+        out.flush()
+        os.fsync(out.fileno())
+        save_checkpoint(checkpoint_path, args.input, done + written, out.tell())
+
+    def drain(future):
+        nonlocal written
+        record, outcome = future.result()
+        write_line(out, record)
+        counts[outcome] += 1
+        written += 1
+        if written % args.checkpoint_every == 0:
+            commit()
+            rate = written / (time.perf_counter() - started)
+            print(f"{done + written} rows ({rate:.1f}/s)", file=sys.stderr)
+
+    # Results are written in input order; the window bounds memory and keeps all workers busy
+    window = deque()
+    try:
+        for row in itertools.islice(read_rows(args.input), done, None):
+            window.append(pool.submit(interpret_row, interpreter, router, cache, safety, row))
+            if len(window) >= 2 * args.concurrency:
+                drain(window.popleft())
+        while window:
+            drain(window.popleft())
+    except KeyboardInterrupt:
+        interrupted = True
+        print("interrupted; run the same command again to resume", file=sys.stderr)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        commit()
+        out.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "rows": done + written,
+        "this_run": written,
+        **counts,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(written / elapsed, 2) if elapsed else None,
+        **{k: v for k, v in interpreter.usage.stats().items() if k.endswith("tokens")},
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    return 130 if interrupted else 0
+
+
+# -----------------------------
+# OpenAI Batch API files
+# -----------------------------
+def part_path(path, part):
+    if part == 1:
+        return path
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}-{part}{p.suffix}"))
+
+
+def export(args):
+    """Write Batch API request lines; starts a new file at the per-file request or size limit."""
+    part, requests, skipped = 1, 0, 0
+    router = router_from_env()
+    in_file, size = 0, 0
+    out = open(args.output, "wb")
+    for row_id, dream, school in read_rows(args.input):
+        if school not in REGISTRY or not dream.strip():
+            skipped += 1
+            print(f"skipping row {row_id}: {'empty dream' if not dream.strip() else f'unknown school {school}'}",
+                  file=sys.stderr)
+            continue
+        params = router.route(dream, school).params()
+        if args.model:
+            params["model"] = args.model
+        line = json.dumps({
+            "custom_id": row_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request_body(dream, school, **params),
+        }, ensure_ascii=False).encode("utf-8") + b"\n"
+        if in_file and (in_file >= args.max_requests or size + len(line) > args.max_bytes):
+            out.close()
+            part += 1
+            in_file, size = 0, 0
+            out = open(part_path(args.output, part), "wb")
+        out.write(line)
+        requests += 1
+        in_file += 1
+        size += len(line)
+    out.close()
+    files = [part_path(args.output, n) for n in range(1, part + 1)]
+    print(json.dumps({"requests": requests, "skipped": skipped, "files": files}), file=sys.stderr)
+    return 0
+
+
+def import_results(args):
+    """Turn Batch API output/error lines into result lines (in the order the files list them)."""
+    counts = {"ok": 0, "error": 0}
+    with open(args.output, "wb") as out:
+        for path in args.input:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    record = {"id": item["custom_id"]}
+                    response = item.get("response") or {}
+                    body = response.get("body") or {}
+                    if item.get("error") or response.get("status_code") != 200:
+                        error = item.get("error") or body.get("error") or {}
+                        record["error"] = error.get("message") or f"status {response.get('status_code')}"
+                        counts["error"] += 1
+                    else:
+                        record["interpretation"] = body["choices"][0]["message"]["content"].strip()
+                        counts["ok"] += 1
+                    write_line(out, record)
+    print(json.dumps(counts), file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="interpret every row through the API")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--concurrency", type=int, default=int(os.getenv("DREAM_BATCH_CONCURRENCY", "8")))
+    p.add_argument("--retries", type=int, default=int(os.getenv("DREAM_RETRY_ATTEMPTS", "4")),
+                   help="attempts per row for retryable errors")
+    p.add_argument("--checkpoint", help="checkpoint file (default: <output>.ckpt)")
+    p.add_argument("--checkpoint-every", type=int, default=50, help="rows between checkpoints")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    p.add_argument("--cache", help="SQLite interpretation cache to read and fill (e.g. the app's DREAM_CACHE_PATH)")
+    p.add_argument("--cache-max-entries", type=int, default=int(os.getenv("DREAM_CACHE_MAX_ENTRIES", "10000")))
+    p.add_argument("--no-safety-filter", action="store_true",
+                   help="send crisis inputs to the model instead of answering them locally")
+    p.set_defaults(handler=run)
+
+    p = commands.add_parser("export", help="write OpenAI Batch API request files")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--model", help="one model for every row (default: routed like the app)")
+    p.add_argument("--max-requests", type=int, default=BATCH_MAX_REQUESTS)
+    p.add_argument("--max-bytes", type=int, default=BATCH_MAX_BYTES)
+    p.set_defaults(handler=export)
+
+    p = commands.add_parser("import", help="convert OpenAI Batch API output files to result lines")
+    p.add_argument("input", nargs="+", help="batch output and/or error files")
+    p.add_argument("-o", "--output", required=True)
+    p.set_defaults(handler=import_results)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Throughput and latency of api_server.py against the local mock OpenAI server.
+
+Starts the mock server and the API (uvicorn, --workers processes) as subprocesses, then
+for each --concurrency level keeps that many clients busy with POST /interpret until
+--requests requests have finished. Reports requests/sec and latency percentiles per level,
+for plain JSON responses and, with --stream, time to the first SSE delta as well. Every
+request has a different dream, so the interpretation cache never answers; use --cached to
+repeat one dream and measure the cache-hit path instead.
+
+    python bench/api_bench.py --workers 2 --concurrency 1 8 32 128 --output api_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from mock_openai import add_mock_arguments
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)  # any response means the server is listening
+            return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+
+async def run_level(base_url, concurrency, total, stream, cached):
+    latencies, first_deltas, errors = [], [], 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def one(client, n):
+        dream = "I was flying over a purple sea" if cached else f"I was flying over a purple sea, dream {concurrency}-{n}"
+        body = {"dream": dream, "school": "Gestalt", "stream": stream}
+        started = time.perf_counter()
+        if stream:
+            first = None
+            async with client.stream("POST", "/interpret", json=body) as resp:
+                async for line in resp.aiter_lines():
+                    if first is None and line == "event: delta":
+                        first = time.perf_counter() - started
+                    if line == "event: error":
+                        return False
+            if first is not None:
+                first_deltas.append(first)
+            ok = resp.status_code == 200
+        else:
+            resp = await client.post("/interpret", json=body)
+            ok = resp.status_code == 200
+        latencies.append(time.perf_counter() - started)
+        return ok
+
+    async def client_loop(client):
+        nonlocal errors
+        for n in counter:
+            try:
+                if not await one(client, n):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "requests_per_second": round(total / elapsed, 1),
+        "latency_ms": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99)},
+    }
+    if stream:
+        report["first_delta_ms"] = {"p50": percentile(first_deltas, 0.5), "p95": percentile(first_deltas, 0.95)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="API worker processes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="request SSE streaming")
+    parser.add_argument("--cached", action="store_true", help="repeat one dream (cache hits after the first)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock_port, api_port = free_port(), free_port()
+    mock_args = [
+        "--ttfb", str(args.ttfb),
+        "--ttfb-jitter", str(args.ttfb_jitter),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens),
+        "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status),
+    ]
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-mock",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        DREAM_CACHE_MAX_ENTRIES=str(max(args.requests, 512)),
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, str(ROOT / "bench" / "mock_openai.py"), "--port", str(mock_port), *mock_args],
+            stdout=subprocess.DEVNULL,
+        ),
+        subprocess.Popen(
+            [sys.executable, str(ROOT / "api_server.py"), "--port", str(api_port), "--workers", str(args.workers)],
+            cwd=ROOT,
+            env=env,
+        ),
+    ]
+    base_url = f"http://127.0.0.1:{api_port}"
+    try:
+        wait_until_up(f"http://127.0.0.1:{mock_port}/")
+        wait_until_up(f"{base_url}/healthz")
+        levels = [asyncio.run(run_level(base_url, c, args.requests, args.stream, args.cached)) for c in args.concurrency]
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    report = {
+        "workers": args.workers,
+        "stream": args.stream,
+        "cached": args.cached,
+        "mock": {"ttfb": args.ttfb, "tokens_per_second": args.tokens_per_second, "completion_tokens": args.completion_tokens},
+        "levels": levels,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
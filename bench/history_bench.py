@@ -0,0 +1,94 @@
+"""
+Query latency of the interpretation history at scale.
+
+Fills a fresh SQLite history with --rows interpretations spread over --users users, plus
+one heavy user who owns --heavy of them, then times what the History tab and the
+Interpret tab do: the first page, a page deep in the heavy user's history (keyset), a
+school filter, a full-text search, and the "already interpreted" lookup. record() is
+timed too, since it runs on the script thread.
+
+    python bench/history_bench.py --rows 100000 --output history_results.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from history import HistoryStore  # noqa: E402
+
+SCHOOLS = ["General", "Gestalt", "Hindu/Vedic", "Nordic/Norse", "Freudian/Psychoanalytic", "Ancient Egyptian"]
+WORDS = (
+    "house forest river mother train snake teeth door key wolf ocean mountain school exam baby fire car "
+    "garden stage friend kitchen bird moon mirror bridge storm island city flying falling hiding swimming"
+).split()
+
+
+def dream(rng):
+    return "I was " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+
+
+def timed(fn, repeats=50):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--heavy", type=int, default=20_000, help="rows owned by the heaviest user")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    store = HistoryStore(path, max_pending=args.rows + 1)
+
+    started = time.perf_counter()
+    record_timings = []
+    for i in range(args.rows):
+        user = "heavy" if i < args.heavy else f"user-{rng.randrange(args.users)}"
+        t = time.perf_counter()
+        store.record(user, rng.choice(SCHOOLS), dream(rng), "interpretation " * 60)
+        record_timings.append(time.perf_counter() - t)
+    store.flush()
+    fill_s = time.perf_counter() - started
+
+    last = store.page("heavy", limit=1)[0]
+    deep_id = last["id"] - args.heavy // 2  # halfway back through the heavy user's rows
+    report = {
+        "rows": args.rows,
+        "db_mb": round(os.path.getsize(path) / 1e6, 1),
+        "fill_s": round(fill_s, 2),
+        "record_us_p50": round(statistics.median(record_timings) * 1e6, 2),
+        "ms_p50": {
+            "first_page": timed(lambda: store.page("heavy")),
+            "deep_page": timed(lambda: store.page("heavy", before=deep_id)),
+            "school_filter": timed(lambda: store.page("heavy", school="Gestalt")),
+            "search": timed(lambda: store.page("heavy", search="wolf mirr")),
+            "search_small_user": timed(lambda: store.page("user-1", search="wolf mirr")),
+            "already_interpreted": timed(lambda: store.find("heavy", "Gestalt", "I was flying over the sea")),
+        },
+    }
+    store.close()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
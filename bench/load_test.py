@@ -0,0 +1,259 @@
+"""
+Concurrency benchmark for app.py against the local mock OpenAI server.
+
+Runs N simulated sessions through the real Interpret flow with Streamlit's AppTest and
+writes a JSON report: time-to-first-byte and time-to-complete percentiles, script runs
+and bytes sent to the browser per interpretation, and traced memory per session.
+
+    python bench/load_test.py --sessions 20 --ttfb 0.5 --output bench_results.json
+
+Notes on the model:
+- AppTest swaps a process-global Runtime for every script run, so script runs are
+  serialized with a lock. Generation still happens concurrently on the app's shared job
+  executor, which is what this harness is meant to load.
+- Every AppTest session reports the same session id, so the per-session rate limit is
+  raised for the run.
+- Memory per session is peak-RSS growth divided by sessions, or traced Python
+  allocations with --tracemalloc.
+- Time-to-first-byte is what a session sees at its polling interval (--poll-interval),
+  i.e. the first poll that shows any interpretation text.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from mock_openai import add_mock_arguments, config_from_args, start_mock_server
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from streamlit.testing.v1 import app_test as app_test_module  # noqa: E402
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner  # noqa: E402
+
+DREAMS = [
+    "I was flying over the sea and the waves were singing.",
+    "My teeth fell out while I was talking to my teacher.",
+    "A friendly wolf walked me home through a snowy forest.",
+    "I was late for a train that kept changing colours.",
+    "I found a hidden room in my house full of old books.",
+    "I was falling slowly through clouds made of cotton candy.",
+    "A giant turtle carried my whole school across a river.",
+    "I could breathe underwater and talked to a wise octopus.",
+]
+
+RUN_LOCK = threading.Lock()
+_current = None  # session whose script run holds RUN_LOCK
+
+
+class RecordingScriptRunner(LocalScriptRunner):
+    """Counts script runs and forward-message bytes for the session doing the run."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_event.connect(self._record, weak=False)
+
+    def _record(self, sender, event, **kwargs):
+        session = _current
+        if session is None:
+            return
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            session.script_runs += 1
+        elif event == ScriptRunnerEvent.ENQUEUE_FORWARD_MSG:
+            session.bytes_sent += kwargs["forward_msg"].ByteSize()
+
+
+class Session:
+    def __init__(self, index, dream, style):
+        self.index = index
+        self.dream = dream
+        self.style = style
+        self.app = None
+        self.script_runs = 0
+        self.bytes_sent = 0
+        self.polls = 0
+        self.ttfb = None
+        self.complete = None
+        self.error = None
+        self.text = None
+
+    def run(self):
+        global _current
+        with RUN_LOCK:
+            _current = self
+            try:
+                self.app.run()
+            finally:
+                _current = None
+        self.polls += 1
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+
+def session_value(app, key, default=None):
+    try:
+        return app.session_state[key]
+    except KeyError:
+        return default
+
+
+def drive_session(session, poll_interval, timeout):
+    try:
+        session.app = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+        session.app.secrets["OPENAI_API_KEY"] = os.environ["OPENAI_API_KEY"]
+        session.run()
+        # Only count what the interpretation itself costs, not the initial page load
+        session.script_runs = session.bytes_sent = session.polls = 0
+        session.app.text_area[0].input(session.dream)
+        session.app.selectbox[0].select(session.style)
+        started = time.perf_counter()
+        button = next(b for b in session.app.button if b.label == "Interpret")
+        button.click()
+        session.run()
+        while True:
+            if session.ttfb is None and interpretation_visible(session.app):
+                session.ttfb = time.perf_counter() - started
+            if session_value(session.app, "interpret_phase") in ("done", "error"):
+                session.complete = time.perf_counter() - started
+                session.text = session_value(session.app, "interpretation_text")
+                if session.ttfb is None:
+                    session.ttfb = session.complete
+                return
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError("interpretation did not finish in time")
+            time.sleep(poll_interval)
+            session.run()
+    except Exception as e:
+        session.error = f"{type(e).__name__}: {e}"
+
+
+def interpretation_visible(app):
+    # Anything in the Interpret tab that isn't raw HTML (loader, styles) is interpretation text
+    if not app.tabs:
+        return False
+    for element in app.tabs[0].markdown:
+        value = str(element.value).strip()
+        if value and not value.startswith("<"):
+            return True
+    return False
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 1),
+        "p95_ms": round(pick(0.95) * 1000, 1),
+        "p99_ms": round(pick(0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+def summary(values):
+    if not values:
+        return None
+    return {"mean": round(statistics.fmean(values), 2), "max": max(values), "min": min(values)}
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--style", default="Jungian Analytical Psychology")
+    parser.add_argument("--same-dream", action="store_true", help="every session submits the same dream")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--base-url", help="use an already running OpenAI-compatible server")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument(
+        "--tracemalloc", action="store_true",
+        help="measure per-session memory with tracemalloc (precise, but slows every run down)",
+    )
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        mock_server, mock_stats, base_url = start_mock_server(config_from_args(args))
+        mock = (mock_server, mock_stats)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ.setdefault("DREAM_SESSION_REQUESTS_PER_MINUTE", "100000")
+    app_test_module.LocalScriptRunner = RecordingScriptRunner
+
+    sessions = []
+    for i in range(args.sessions):
+        dream = DREAMS[0] if args.same_dream else f"{DREAMS[i % len(DREAMS)]} (night {i})"
+        sessions.append(Session(i, dream, args.style))
+
+    if args.tracemalloc:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    else:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=drive_session, args=(s, args.poll_interval, args.timeout)) for s in sessions
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    if args.tracemalloc:
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+    else:
+        retained = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline
+
+    ok = [s for s in sessions if s.error is None]
+    report = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "sessions": len(sessions),
+        "completed": len(ok),
+        "errors": [s.error for s in sessions if s.error],
+        "wall_time_s": round(wall, 3),
+        "time_to_first_byte": percentiles([s.ttfb for s in ok]),
+        "time_to_complete": percentiles([s.complete for s in ok]),
+        "script_runs_per_interpretation": summary([s.script_runs for s in ok]),
+        "client_polls_per_interpretation": summary([s.polls for s in ok]),
+        "bytes_sent_per_interpretation": summary([s.bytes_sent for s in ok]),
+        "memory_per_session_kb": round(retained / max(1, len(sessions)) / 1024, 1),
+    }
+    if mock is not None:
+        report["upstream"] = {"requests": mock[1].requests, "errors": mock[1].errors}
+        mock[0].shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
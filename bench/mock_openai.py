@@ -0,0 +1,189 @@
+"""
+Local OpenAI-compatible mock server for benchmarks.
+
+Serves POST /v1/chat/completions (plain JSON and SSE streaming) with configurable
+time-to-first-byte, token rate, completion length and error injection.
+
+    python bench/mock_openai.py --port 8001 --ttfb 0.4 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=sk-mock streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "You might be floating above a calm sea of ideas, and that could mean your mind is "
+    "gently sorting the day. An AI dreaming of understanding human brains? I'd need a "
+    "billion naps first!"
+).split()
+
+
+@dataclass
+class MockConfig:
+    ttfb: float = 0.3  # seconds before the first byte
+    ttfb_jitter: float = 0.1
+    tokens_per_second: float = 80.0
+    completion_tokens: int = 120
+    error_rate: float = 0.0
+    error_status: int = 500
+    retry_after: float = 1.0
+    cached_prompt_tokens: int = 0
+
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(config: MockConfig, stats: MockStats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            with stats.lock:
+                stats.requests += 1
+                fail = random.random() < config.error_rate
+                if fail:
+                    stats.errors += 1
+
+            time.sleep(max(0.0, config.ttfb + random.uniform(-config.ttfb_jitter, config.ttfb_jitter)))
+            if fail:
+                self._send_json(
+                    config.error_status,
+                    {"error": {"message": "injected failure", "type": "server_error", "code": None}},
+                    headers={"Retry-After": str(config.retry_after)},
+                )
+                return
+
+            n_tokens = min(config.completion_tokens, request.get("max_tokens") or config.completion_tokens)
+            tokens = [WORDS[i % len(WORDS)] + " " for i in range(n_tokens)]
+            prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n_tokens,
+                "total_tokens": prompt_tokens + n_tokens,
+                "prompt_tokens_details": {"cached_tokens": min(config.cached_prompt_tokens, prompt_tokens)},
+            }
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": request.get("model")}
+            delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+            if not request.get("stream"):
+                time.sleep(delay * n_tokens)
+                self._send_json(200, {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            def send(payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            for token in tokens:
+                send({**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                ]})
+                time.sleep(delay)
+            send({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {}, "finish_reason": "stop"}
+            ]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 drops connections under load tests
+
+
+def start_mock_server(config: MockConfig, host="127.0.0.1", port=0):
+    """Start the server on a background thread; returns (server, stats, base_url)."""
+    stats = MockStats()
+    server = MockServer((host, port), make_handler(config, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--ttfb", type=float, default=MockConfig.ttfb)
+    parser.add_argument("--ttfb-jitter", type=float, default=MockConfig.ttfb_jitter)
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=MockConfig.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--error-status", type=int, default=MockConfig.error_status)
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after)
+    parser.add_argument("--cached-prompt-tokens", type=int, default=MockConfig.cached_prompt_tokens)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        ttfb=args.ttfb,
+        ttfb_jitter=args.ttfb_jitter,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        cached_prompt_tokens=args.cached_prompt_tokens,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer((args.host, args.port), make_handler(config_from_args(args), MockStats()))
+    print(f"Mock OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
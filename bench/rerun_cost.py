@@ -0,0 +1,223 @@
+"""
+Per-rerun cost of the app as seen by a real browser session.
+
+Starts `streamlit run` on the given app against the local mock OpenAI server, connects to
+its websocket like the frontend does, and replays a short user journey:
+
+    load -> type a dream -> pick a school -> Interpret (until the result shows) -> Library button
+
+For every step it reports the number of script runs (full or fragment), the bytes the
+server sent over the websocket, and the server process CPU time. Fragment-scoped widgets
+are sent as fragment reruns and auto-rerun fragments are polled at their interval, the
+way the frontend does it.
+
+    python bench/rerun_cost.py --output rerun_after.json
+    git worktree add /tmp/before <rev> && python bench/rerun_cost.py --app /tmp/before/app.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+
+from mock_openai import MockConfig, start_mock_server
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = Path(__file__).resolve().parents[1]
+WIDGET_TYPES = ("text_area", "selectbox", "button", "multiselect", "checkbox", "toggle")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+
+
+class Client:
+    def __init__(self, ws, server_pid):
+        self.ws = ws
+        self.server_pid = server_pid
+        self.widgets = {}  # label -> (proto type, widget id, fragment id)
+        self.values = {}  # widget id -> (value field, value)
+        self.auto_reruns = {}  # fragment id -> interval
+        self.markdown = []
+
+    async def _run(self, fragment_id="", trigger=None, auto=False):
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.fragment_id = fragment_id
+        state.is_auto_rerun = auto
+        for widget_id, (field, value) in self.values.items():
+            ws = state.widget_states.widgets.add()
+            ws.id = widget_id
+            setattr(ws, field, value)
+        if trigger is not None:
+            ws = state.widget_states.widgets.add()
+            ws.id = trigger
+            ws.trigger_value = True
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+
+        runs = 0
+        sent = 0
+        auto_this_run = {}
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise RuntimeError("websocket closed")
+            sent += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype in WIDGET_TYPES:
+                    widget = getattr(element, etype)
+                    self.widgets[widget.label] = (etype, widget.id, fwd.delta.fragment_id)
+                elif etype == "markdown":
+                    self.markdown.append(element.markdown.body)
+            elif kind == "auto_rerun":
+                auto_this_run[fwd.auto_rerun.fragment_id] = fwd.auto_rerun.interval
+            elif kind == "script_finished":
+                runs += 1
+                status = fwd.script_finished
+                if status == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    self.auto_reruns = auto_this_run
+                    return runs, sent
+                if status == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    self.auto_reruns.update(auto_this_run)
+                    return runs, sent
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("script failed to compile")
+                auto_this_run = {}  # FINISHED_EARLY_FOR_RERUN: another run follows
+
+    async def step(self, name, results, fragment_id="", trigger=None, follow_auto=False, timeout=60):
+        cpu0, t0 = cpu_seconds(self.server_pid), time.perf_counter()
+        runs, sent = await self._run(fragment_id, trigger)
+        while follow_auto and self.auto_reruns and time.perf_counter() - t0 < timeout:
+            fragment, interval = next(iter(self.auto_reruns.items()))
+            await asyncio.sleep(interval)
+            r, s = await self._run(fragment, auto=True)
+            runs += r
+            sent += s
+        cpu = cpu_seconds(self.server_pid) - cpu0
+        results.append({
+            "step": name,
+            "script_runs": runs,
+            "bytes_sent": sent,
+            "server_cpu_ms": round(cpu * 1000, 1),
+            "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "bytes_per_run": round(sent / max(runs, 1)),
+            "server_cpu_ms_per_run": round(cpu * 1000 / max(runs, 1), 2),
+        })
+
+    def widget(self, label):
+        return self.widgets[label]
+
+    def set_value(self, label, field, value):
+        _, widget_id, fragment_id = self.widget(label)
+        self.values[widget_id] = (field, value)
+        return fragment_id
+
+
+async def journey(port, server_pid, dream, school):
+    request = HTTPRequest(
+        f"ws://127.0.0.1:{port}/_stcore/stream",
+        headers={"Origin": f"http://127.0.0.1:{port}"},
+    )
+    ws = await websocket_connect(request, max_message_size=50 * 1024 * 1024)
+    client = Client(ws, server_pid)
+    results = []
+    await client.step("load", results)
+    text_label = next(label for label, (t, _, _) in client.widgets.items() if t == "text_area")
+    fragment = client.set_value(text_label, "string_value", dream)
+    await client.step("type dream", results, fragment_id=fragment)
+    fragment = client.set_value("Choose an interpretation school", "string_value", school)
+    await client.step("pick school", results, fragment_id=fragment)
+    _, button, fragment = client.widget("Interpret")
+    await client.step("interpret", results, fragment_id=fragment, trigger=button, follow_auto=True)
+    _, button, fragment = client.widget("Interpret my dream")
+    await client.step("library button", results, fragment_id=fragment, trigger=button)
+    ws.close()
+    return results
+
+
+def wait_for_health(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("streamlit did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=str(ROOT / "app.py"))
+    parser.add_argument("--dream", default="I was flying over the sea and the waves were singing.")
+    parser.add_argument("--school", default="Gestalt")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    mock, _, base_url = start_mock_server(MockConfig(ttfb=0.3, tokens_per_second=150, completion_tokens=150))
+    port = free_port()
+    app = Path(args.app).resolve()
+    api_key = os.getenv("OPENAI_API_KEY", "sk-mock")
+    env = {**os.environ, "OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": api_key}
+    # app.py reads st.secrets, which needs a secrets file; keep it out of the repo
+    workdir = tempfile.mkdtemp(prefix="rerun-cost-")
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f'OPENAI_API_KEY = "{api_key}"\n')
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(app), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_health(port)
+        steps = asyncio.run(journey(port, server.pid, args.dream, args.school))
+    finally:
+        server.terminate()
+        server.wait()
+        mock.shutdown()
+
+    report = {
+        "app": str(app),
+        "steps": steps,
+        "total": {
+            "script_runs": sum(s["script_runs"] for s in steps),
+            "bytes_sent": sum(s["bytes_sent"] for s in steps),
+            "server_cpu_ms": round(sum(s["server_cpu_ms"] for s in steps), 1),
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
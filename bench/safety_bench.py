@@ -0,0 +1,98 @@
+"""
+Accuracy and cost of the local safety pre-filter.
+
+Runs every line of bench/data/safety_labelled.jsonl (label: crisis, offtopic or dream)
+through SafetyFilter with the off-topic rule on, and reports false-positive and
+false-negative rates per category plus the misclassified texts. Then times check() on
+labelled texts and on long dreams.
+
+    python bench/safety_bench.py --output safety_results.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from safety import SafetyFilter  # noqa: E402
+
+LABELLED = Path(__file__).resolve().parent / "data" / "safety_labelled.jsonl"
+
+
+def load_labelled(path=LABELLED):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def accuracy(safety, items):
+    predicted = []
+    for item in items:
+        result = safety.check(item["text"])
+        predicted.append(result.category if result is not None else "dream")
+    report = {}
+    for category in ("crisis", "offtopic"):
+        positives = [p for item, p in zip(items, predicted) if item["label"] == category]
+        negatives = [p for item, p in zip(items, predicted) if item["label"] != category]
+        report[category] = {
+            "positives": len(positives),
+            "negatives": len(negatives),
+            "false_negative_rate": round(sum(p != category for p in positives) / len(positives), 3),
+            "false_positive_rate": round(sum(p == category for p in negatives) / len(negatives), 3),
+        }
+    report["misclassified"] = [
+        {"text": item["text"], "label": item["label"], "predicted": p}
+        for item, p in zip(items, predicted)
+        if p != item["label"]
+    ]
+    return report
+
+
+def timing(safety, texts, repeats):
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            safety.check(text)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "chars_mean": round(statistics.mean(len(t) for t in texts)),
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+        "p99_us": round(timings[int(len(timings) * 0.99)] * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    safety = SafetyFilter(offtopic=True)
+    build_ms = (time.perf_counter() - started) * 1000
+    items = load_labelled()
+    texts = [item["text"] for item in items]
+    long_dreams = [" ".join(texts[i:i + 12]) * 2 for i in range(0, len(texts), 12)]
+    report = {
+        "items": len(items),
+        "build_ms": round(build_ms, 2),
+        "accuracy": accuracy(safety, items),
+        "timing": {
+            "labelled": timing(safety, texts, args.repeats),
+            "long": timing(safety, long_dreams, args.repeats),
+        },
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Precision/recall and lookup latency of the semantic cache on the bundled dream corpus.
+
+bench/data/dream_paraphrases.jsonl groups dreams that mean the same thing. The first dream
+of every multi-dream group is stored; the other members are queries that should hit it.
+Single-dream groups (near misses that share words with a stored dream, and unrelated
+dreams) are queries that should miss.
+
+    python bench/semantic_cache_bench.py --output semantic_results.json
+
+For each threshold: precision = correct hits / all hits, recall = correct hits / queries
+that should hit. Latency is the median lookup time with the school's index padded to
+each size in --sizes with synthetic dreams.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from semantic_cache import SemanticCache  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "data" / "dream_paraphrases.jsonl"
+STYLE = "General"
+WORDS = (
+    "house forest river mother train snake teeth door key wolf ocean mountain school exam "
+    "baby fire car garden stage friend kitchen bird moon mirror bridge storm island city "
+    "running falling flying hiding searching singing swimming climbing lost broken old red"
+).split()
+
+
+def load_groups(path=CORPUS):
+    groups = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                groups[item["group"]].append(item["dream"])
+    return groups
+
+
+def precision_recall(groups, thresholds, dim):
+    stored = {g: dreams[0] for g, dreams in groups.items() if len(dreams) > 1}
+    queries = [(g, d) for g, dreams in groups.items() for d in (dreams[1:] if g in stored else dreams)]
+    cache = SemanticCache(threshold=-1.0, dim=dim, max_entries=len(stored))
+    for g, dream in stored.items():
+        cache.add(dream, STYLE, str(g))
+
+    results = []
+    for threshold in thresholds:
+        cache.threshold = threshold
+        hits = correct = 0
+        for g, dream in queries:
+            found = cache.lookup(dream, STYLE)
+            if found is not None:
+                hits += 1
+                correct += found[0] == str(g)
+        positives = sum(1 for g, _ in queries if g in stored)
+        results.append({
+            "threshold": threshold,
+            "precision": round(correct / hits, 3) if hits else None,
+            "recall": round(correct / positives, 3),
+            "false_hits": hits - correct,
+        })
+    return results
+
+
+def synthetic_dream(rng):
+    return "I was " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+
+
+def lookup_latency(groups, sizes, dim, repeats=200):
+    rng = random.Random(0)
+    queries = [d for dreams in groups.values() for d in dreams]
+    results = []
+    for size in sizes:
+        cache = SemanticCache(dim=dim, max_entries=size)
+        for i in range(size):
+            cache.add(f"{synthetic_dream(rng)} {i}", STYLE, "")
+        timings = []
+        for i in range(repeats):
+            started = time.perf_counter()
+            cache.lookup(queries[i % len(queries)], STYLE)
+            timings.append(time.perf_counter() - started)
+        results.append({"entries": size, "lookup_ms_p50": round(statistics.median(timings) * 1000, 3)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--thresholds", default="0.5,0.55,0.6,0.65,0.7,0.75,0.8,0.85,0.9")
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    groups = load_groups()
+    report = {
+        "dim": args.dim,
+        "groups": len(groups),
+        "dreams": sum(len(d) for d in groups.values()),
+        "thresholds": precision_recall(groups, [float(t) for t in args.thresholds.split(",")], args.dim),
+        "latency": lookup_latency(groups, [int(s) for s in args.sizes.split(",")], args.dim),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
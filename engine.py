@@ -0,0 +1,149 @@
+"""
+Interpretation engine shared by the Streamlit app, the batch CLI and the HTTP API.
+
+Nothing here imports Streamlit. It builds the request (system prompt, school block,
+dream), calls OpenAI with retries and an optional circuit breaker, and records token
+usage.
+"""
+import asyncio
+import importlib.util
+import os
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from prompts import PromptUsage, build_messages
+from resilience import call_with_retry
+
+MODEL = "gpt-4o"
+MAX_TOKENS = 500
+TEMPERATURE = 0.8
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("DREAM_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("DREAM_HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("DREAM_HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def make_client(api_key=None) -> OpenAI:
+    # SDK retries are off; Interpreter retries with backoff (and the breaker) instead
+    http_client = DefaultHttpxClient(limits=http_limits(), http2=importlib.util.find_spec("h2") is not None)
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def make_async_client(api_key=None, max_retries=2, timeout=60.0) -> AsyncOpenAI:
+    # One pooled client per event loop; the async paths have no retry loop of their own, so the SDK retries
+    http_client = DefaultAsyncHttpxClient(limits=http_limits(), http2=importlib.util.find_spec("h2") is not None)
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=max_retries, timeout=timeout)
+
+
+def request_body(
+    dream_text: str, style: str, model=MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE, preview=False
+) -> dict:
+    """Chat completion parameters for one interpretation (also the body of a Batch API line)."""
+    return {
+        "model": model,
+        "messages": build_messages(dream_text, style, preview=preview),
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+
+
+class Interpreter:
+    def __init__(self, client: OpenAI, breaker=None, usage=None, max_attempts=4):
+        self.client = client
+        self.breaker = breaker
+        self.usage = usage if usage is not None else PromptUsage()
+        self.max_attempts = max_attempts
+
+    def create_completion(self, **kwargs):
+        return call_with_retry(
+            lambda: self.client.chat.completions.create(**kwargs),
+            breaker=self.breaker,
+            max_attempts=self.max_attempts,
+        )
+
+    # `params` are request_body's model / max_tokens / temperature / preview (see routing.Route)
+    def interpret(self, dream_text: str, style: str, **params) -> str:
+        resp = self.create_completion(**request_body(dream_text, style, **params))
+        self.usage.record(resp.usage)
+        return resp.choices[0].message.content.strip()
+
+    def interpret_stream(self, dream_text: str, style: str, on_usage=None, **params):
+        # Same request as interpret, but yields text deltas as they arrive
+        stream = self.create_completion(
+            **request_body(dream_text, style, **params),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    self.usage.record(chunk.usage)
+                    if on_usage is not None:
+                        on_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()  # also when the consumer stops early
+
+    async def interpret_async(self, aclient: AsyncOpenAI, dream_text: str, style: str, timeout=None, **params) -> str:
+        # Pass `timeout` here rather than wrapping the call in wait_for: running out of time is an
+        # upstream failure, but being cancelled by the caller (a rerun, a closed request) is not
+        trial = self.breaker.before_call() if self.breaker is not None else False
+        try:
+            resp = await asyncio.wait_for(
+                aclient.chat.completions.create(**request_body(dream_text, style, **params)), timeout
+            )
+        except asyncio.CancelledError:
+            if trial:
+                self.breaker.release_trial()
+            raise
+        except Exception:  # includes asyncio.TimeoutError
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        self.usage.record(resp.usage)
+        return resp.choices[0].message.content.strip()
+
+    async def interpret_stream_async(self, aclient: AsyncOpenAI, dream_text: str, style: str, on_usage=None, **params):
+        # Async twin of interpret_stream; a failure before or during the stream counts against the breaker
+        trial = self.breaker.before_call() if self.breaker is not None else False
+        try:
+            stream = await aclient.chat.completions.create(
+                **request_body(dream_text, style, **params),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        self.usage.record(chunk.usage)
+                        if on_usage is not None:
+                            on_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped early or went away; not an upstream failure, nor a success
+            if trial:
+                self.breaker.release_trial()
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
@@ -0,0 +1,164 @@
+"""
+Offline fallback interpretations, for when the API can't answer in time.
+
+`python fallback.py build` turns the curated symbol list in data/dream_symbols.json and
+the Library text of each school into data/symbol_index.json: for every school, a
+child-friendly meaning per symbol (the school's own reading if the dataset has one, else
+its category's, else the general one) plus a framing sentence, a question and a next
+step. At run time the dream's words are normalized the way the semantic cache does it
+(synonyms, simple stemming), matched against the symbol keywords, and the matches are
+filled into a short template. No model is involved, so an answer takes well under a
+millisecond.
+"""
+import argparse
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import openai
+
+from resilience import CircuitOpenError, is_quota_error
+from schools import DEFAULT_SCHOOL, REGISTRY, SCHOOLS_PATH
+from semantic_cache import terms
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+SYMBOLS_PATH = DATA_DIR / "dream_symbols.json"
+INDEX_PATH = DATA_DIR / "symbol_index.json"
+
+NOTICE = (
+    "Our dream engine is taking a little nap, so here is a quick reading from our dream-symbol notebook. "
+    "Try again in a few minutes for a full interpretation!"
+)
+JOKE = "An AI dreaming of understanding human brains? I'd need a billion naps first!"
+LIMITATION = "Limitation: AI interpretations are symbolic aids, not substitutes for professional therapy."
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def fallback_reason(e: Exception):
+    """"timeout", "circuit_open" or "quota" for errors the fallback should answer; None otherwise."""
+    if isinstance(e, (TimeoutError, openai.APITimeoutError)):  # asyncio.TimeoutError is TimeoutError
+        return "timeout"
+    if isinstance(e, CircuitOpenError):
+        return "circuit_open"
+    if is_quota_error(e):
+        return "quota"
+    return None
+
+
+# -----------------------------
+# Offline build
+# -----------------------------
+def library_lens(school) -> str:
+    # The Library's second sentence says how the school reads dreams; the first is history
+    if not school.library:
+        return ""
+    sentences = SENTENCE_RE.split(school.library[0].strip())
+    return sentences[1] if len(sentences) > 1 else sentences[0]
+
+
+def build_index(symbols_path=SYMBOLS_PATH, registry=REGISTRY) -> dict:
+    with open(symbols_path, encoding="utf-8") as f:
+        dataset = json.load(f)
+    keywords = {}
+    for entry in dataset["symbols"]:
+        for keyword in entry["keywords"]:
+            for term in terms(keyword):
+                if keywords.setdefault(term, entry["symbol"]) != entry["symbol"]:
+                    raise ValueError(f"keyword {keyword!r} matches both {keywords[term]} and {entry['symbol']}")
+
+    schools = {}
+    for school in registry:
+        curated = dataset["schools"].get(school.name, {})
+        category = dataset["categories"][school.category]
+        schools[school.name] = {
+            "lens": curated.get("lens") or library_lens(school),
+            "question": curated.get("question", category["question"]),
+            "step": curated.get("step", category["step"]),
+            "symbols": {
+                entry["symbol"]: entry["schools"].get(school.name) or entry.get(school.category) or entry["meaning"]
+                for entry in dataset["symbols"]
+            },
+        }
+    sources = b"".join(Path(p).read_bytes() for p in (symbols_path, SCHOOLS_PATH))
+    return {
+        "source_hash": hashlib.sha256(sources).hexdigest()[:16],
+        "labels": {entry["symbol"]: entry["label"] for entry in dataset["symbols"]},
+        "keywords": keywords,
+        "schools": schools,
+    }
+
+
+def load_index(path=INDEX_PATH) -> dict:
+    # A missing index is built in memory, so a fresh checkout still has a fallback
+    if not Path(path).exists():
+        return build_index()
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -----------------------------
+# Run time
+# -----------------------------
+class FallbackInterpreter:
+    """interpret() returns a short template interpretation built from the symbol index."""
+
+    def __init__(self, index=None, max_symbols=4):
+        self.index = index if index is not None else load_index()
+        self.max_symbols = max_symbols
+
+    def symbols(self, dream_text: str) -> list:
+        """Symbols mentioned in the dream, in order of first mention."""
+        found = []
+        for term in terms(dream_text):
+            symbol = self.index["keywords"].get(term)
+            if symbol is not None and symbol not in found:
+                found.append(symbol)
+        return found[: self.max_symbols]
+
+    def interpret(self, dream_text: str, style: str) -> str:
+        school = self.index["schools"].get(style) or self.index["schools"][DEFAULT_SCHOOL]
+        symbols = self.symbols(dream_text)
+        labels = [self.index["labels"][s] for s in symbols]
+        parts = [f"Chosen school: {style}", NOTICE]
+        if labels:
+            listed = labels[0] if len(labels) == 1 else ", ".join(labels[:-1]) + f" and {labels[-1]}"
+            parts.append(f"Your dream includes {listed}. {school['lens']}")
+            parts.append("\n".join(f"- {label.capitalize()}: {school['symbols'][s]}" for s, label in zip(symbols, labels)))
+        else:
+            parts.append(
+                f"{school['lens']} Even without a clear symbol to point at, the feeling the dream left you with "
+                "is often the best clue to what it might be about."
+            )
+        parts += [
+            f"A question to wonder about: {school['question']}",
+            f"A small next step: {school['step']}",
+            JOKE,
+            LIMITATION,
+        ]
+        return "\n\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="rebuild the symbol index from the dataset and the Library text")
+    build.add_argument("--symbols", default=str(SYMBOLS_PATH))
+    build.add_argument("-o", "--output", default=str(INDEX_PATH))
+    show = commands.add_parser("interpret", help="print the fallback interpretation of a dream")
+    show.add_argument("dream")
+    show.add_argument("--school", default=DEFAULT_SCHOOL)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = build_index(args.symbols)
+        Path(args.output).write_text(json.dumps(index, indent=1, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"{len(index['labels'])} symbols, {len(index['keywords'])} keywords, {len(index['schools'])} schools -> {args.output}")
+    else:
+        if args.school not in REGISTRY:
+            show.error(f"unknown school {args.school!r}; choose from: {', '.join(REGISTRY.names())}")
+        print(FallbackInterpreter().interpret(args.dream, args.school))
+
+
+if __name__ == "__main__":
+    main()
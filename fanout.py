@@ -0,0 +1,30 @@
+import asyncio
+
+
+async def fan_out(styles, interpret, concurrency=11, timeout=60.0):
+    """
+    Run interpret(style) for every style concurrently and yield (style, text, error)
+    in completion order. At most `concurrency` calls are in flight; each call is
+    cancelled if it takes longer than `timeout` seconds once it has started.
+    Leaving the loop early cancels whatever is still running.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(style):
+        async with semaphore:
+            try:
+                text = await asyncio.wait_for(interpret(style), timeout)
+                return style, text, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # includes asyncio.TimeoutError
+                return style, None, e
+
+    tasks = [asyncio.create_task(run_one(style)) for style in styles]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,174 @@
+import atexit
+import hashlib
+import threading
+import time
+import uuid
+
+from interpretation_cache import normalize_dream
+from sqlite_store import BatchWriter, ThreadConnections
+
+
+def dream_key(dream_text: str) -> str:
+    return hashlib.blake2b(normalize_dream(dream_text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def owner_token(user_id: str) -> str:
+    # One FTS token per user, so a search only walks that user's part of the index
+    return "u" + hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fts_query(user_id: str, text: str) -> str:
+    # Every word must match; the last one as a prefix, so results narrow while typing
+    words = [w.replace('"', '""') for w in text.split()]
+    if not words:
+        return ""
+    terms = " ".join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+    return f'owner : "{owner_token(user_id)}" AND dream : ({terms.strip()})'
+
+
+class HistoryStore:
+    """
+    Past interpretations per user in SQLite, with full-text search over the dreams.
+
+    record() only queues the row; a writer thread inserts queued rows in batches, so the
+    script thread never waits on disk. Until a row is written, the first page still shows
+    it (with id None). Reads use one connection per thread. Pages are fetched with keyset
+    pagination (`before` = the last id of the previous page), so every page costs the
+    same however far back the user scrolls.
+    """
+
+    def __init__(self, path, flush_interval=0.5, batch_size=200, max_pending=10_000):
+        if path == ":memory:":
+            # Private in-memory databases are per connection; share one between threads
+            path = f"file:dream-history-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self.path = path
+        self._conn = ThreadConnections(path).get
+        self._unwritten = {}  # user_id -> rows queued but not committed yet
+        self._lock = threading.Lock()
+        self._create(self._conn())
+        self._writer = BatchWriter(
+            "dream-history",
+            self._conn,
+            self._write,
+            on_drop=self._forget,
+            flush_interval=flush_interval,
+            batch_size=batch_size,
+            max_pending=max_pending,
+        )
+        atexit.register(self.close)
+
+    def record(self, user_id: str, school: str, dream_text: str, interpretation: str):
+        if not isinstance(interpretation, str):
+            raise TypeError(f"interpretation must be a string, not {type(interpretation).__name__}")
+        row = (user_id, school, dream_text, dream_key(dream_text), interpretation, time.time())
+        with self._lock:
+            self._unwritten.setdefault(user_id, []).append(row)
+        if not self._writer.put(row):
+            self._forget([row])
+
+    def page(self, user_id: str, school=None, search="", before=None, limit=20) -> list:
+        """Newest first: dicts with id, school, dream, interpretation, created_at."""
+        sql = "SELECT h.id, h.school, h.dream, h.interpretation, h.created_at"
+        match = fts_query(user_id, search)
+        if match:
+            # Walk the user's matches newest first straight from the FTS index
+            sql += " FROM history_fts f JOIN history h ON h.id = f.rowid"
+            where, params, order = ["history_fts MATCH ?"], [match], "f.rowid"
+        else:
+            sql += " FROM history h"
+            where, params, order = ["h.user_id = ?"], [user_id], "h.id"
+        if school:
+            where.append("h.school = ?")
+            params.append(school)
+        if before is not None:
+            where.append(f"{order} < ?")
+            params.append(before)
+        sql += " WHERE " + " AND ".join(where) + f" ORDER BY {order} DESC LIMIT ?"
+        params.append(limit)
+        pending = self._pending(user_id, school, search) if before is None else []
+        rows = self._conn().execute(sql, params).fetchall()
+        if pending:
+            # A row written between the two reads is in both; keep the stored copy
+            stored = {(r[2], r[4]) for r in rows}
+            rows = [r for r in pending if (r[2], r[4]) not in stored] + rows
+        return [
+            {"id": r[0], "school": r[1], "dream": r[2], "interpretation": r[3], "created_at": r[4]} for r in rows
+        ]
+
+    def _pending(self, user_id, school, search):
+        words = [w.lower() for w in search.split()]
+        with self._lock:
+            rows = list(self._unwritten.get(user_id, ()))
+        return [
+            (None, r[1], r[2], r[4], r[5])
+            for r in reversed(rows)
+            if (not school or r[1] == school) and all(w in r[2].lower() for w in words)
+        ]
+
+    def find(self, user_id: str, school: str, dream_text: str):
+        """The user's latest interpretation of this dream (after normalization) for this school."""
+        row = self._conn().execute(
+            "SELECT interpretation FROM history WHERE user_id = ? AND dream_key = ? AND school = ?"
+            " ORDER BY id DESC LIMIT 1",
+            (user_id, dream_key(dream_text), school),
+        ).fetchone()
+        return row[0] if row else None
+
+    def flush(self):
+        """Block until everything recorded so far is written."""
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+
+    def stats(self):
+        return {"pending": self._writer.pending(), "written": self._writer.written, "dropped": self._writer.dropped}
+
+    # -----------------------------
+    # Storage
+    # -----------------------------
+    def _create(self, conn):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " school TEXT NOT NULL,"
+                " dream TEXT NOT NULL,"
+                " dream_key TEXT NOT NULL,"
+                " interpretation TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            # Index entries end with the rowid, so these also serve "ORDER BY id DESC" pages
+            conn.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_user_school ON history (user_id, school)")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_user_dream ON history (user_id, dream_key, school)")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_created_at ON history (created_at)")
+            # Contentless: only rowids come back; the rows themselves are read from history
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                " owner, dream, content='', tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def _write(self, conn, batch):
+        with conn:
+            for row in batch:
+                row_id = conn.execute(
+                    "INSERT INTO history (user_id, school, dream, dream_key, interpretation, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    row,
+                ).lastrowid
+                conn.execute(
+                    "INSERT INTO history_fts (rowid, owner, dream) VALUES (?, ?, ?)",
+                    (row_id, owner_token(row[0]), row[2]),
+                )
+        self._forget(batch)
+
+    def _forget(self, rows):
+        with self._lock:
+            for row in rows:
+                pending = self._unwritten.get(row[0], [])
+                if row in pending:
+                    pending.remove(row)
+                if not pending:
+                    self._unwritten.pop(row[0], None)
@@ -0,0 +1,64 @@
+"""
+The Interpret flow as an explicit state machine.
+
+    idle -> queued -> generating -> done
+      |       |            |
+      +-------+------------+------> error
+    done / error -> idle   (reset)
+
+A cache hit or a rejected submit goes straight from idle to done / error. Everything
+lives in a session-state-like mapping under the keys below, so the transitions work
+on st.session_state and on a plain dict alike.
+"""
+
+IDLE = "idle"
+QUEUED = "queued"
+GENERATING = "generating"
+DONE = "done"
+ERROR = "error"
+
+TRANSITIONS = {
+    IDLE: (QUEUED, DONE, ERROR),
+    QUEUED: (GENERATING, DONE, ERROR),
+    GENERATING: (DONE, ERROR),
+    DONE: (IDLE,),
+    ERROR: (IDLE,),
+}
+
+PHASE_KEY = "interpret_phase"
+STATE_KEYS = (
+    PHASE_KEY,
+    "interpretation_job_id",
+    "interpretation_preview_job_id",
+    "interpretation_request",
+    "interpretation_text",
+)
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def current_phase(state) -> str:
+    return state.get(PHASE_KEY, IDLE)
+
+
+def transition(state, phase: str, **values):
+    current = current_phase(state)
+    if phase not in TRANSITIONS[current]:
+        raise InvalidTransition(f"cannot go from {current} to {phase}")
+    state[PHASE_KEY] = phase
+    for key, value in values.items():
+        state[key] = value
+
+
+def phase_for_job(job) -> str:
+    if job.finished:
+        return DONE if job.status == "done" else ERROR
+    return GENERATING if job.status == "running" else QUEUED
+
+
+def clear_interpretation(state):
+    # Back to idle; leaves the rest of the session (click counts, widgets) alone
+    for key in STATE_KEYS:
+        state.pop(key, None)
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_store import ThreadConnections
+
+
+# -----------------------------
+# Keys
+# -----------------------------
+def normalize_dream(dream_text: str) -> str:
+    # Case and whitespace differences should not produce a different key
+    return " ".join(dream_text.lower().split())
+
+
+def make_key(dream_text: str, style: str, model: str, prompt_version: str) -> str:
+    raw = "\x1f".join([normalize_dream(dream_text), style, model, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class MemoryBackend:
+    """In-process LRU with a size limit and a TTL per entry."""
+
+    def __init__(self, max_entries=512, ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, [variants])
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, variants = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return list(variants)
+
+    def add(self, key, text, max_variants):
+        stored_at, variants = self._entries.get(key, (time.time(), []))
+        if text not in variants:
+            variants = (variants + [text])[-max_variants:]
+        self._entries[key] = (stored_at, variants)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """On-disk backend; one file can be shared by several Streamlit worker processes."""
+
+    def __init__(self, path, max_entries=10_000, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._conn = ThreadConnections(path).get
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS interpretations ("
+                " key TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " used_at REAL NOT NULL,"
+                " PRIMARY KEY (key, text))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS interpretations_used_at ON interpretations (used_at)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._conn() as conn:
+            expired = conn.execute(
+                "DELETE FROM interpretations WHERE key = ? AND stored_at < ?",
+                (key, now - self.ttl_seconds),
+            ).rowcount
+            self.evictions += max(expired, 0)
+            rows = conn.execute(
+                "SELECT text FROM interpretations WHERE key = ? ORDER BY stored_at", (key,)
+            ).fetchall()
+            if rows:
+                conn.execute("UPDATE interpretations SET used_at = ? WHERE key = ?", (now, key))
+        return [r[0] for r in rows] or None
+
+    def add(self, key, text, max_variants):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO interpretations (key, text, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now),
+            )
+            # Keep only the newest max_variants for this key
+            conn.execute(
+                "DELETE FROM interpretations WHERE key = ? AND rowid NOT IN ("
+                " SELECT rowid FROM interpretations WHERE key = ? ORDER BY stored_at DESC LIMIT ?)",
+                (key, key, max_variants),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM interpretations").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM interpretations WHERE rowid IN ("
+                    " SELECT rowid FROM interpretations ORDER BY used_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(DISTINCT key) FROM interpretations").fetchone()[0]
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class InterpretationCache:
+    """
+    Cache in front of the Interpreter (engine.py), keyed by make_key().
+
+    With variants > 1 ("allow cached variety") up to that many different answers are kept
+    per key. Until a key has all its variants, lookups miss so a fresh one gets generated;
+    after that a random stored variant is returned, keeping some of the temperature=0.8 variety.
+    """
+
+    def __init__(self, backend=None, variants=1):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            stored = self.backend.get(key)
+            if not stored or len(stored) < self.variants:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return random.choice(stored)
+
+    def put(self, key, text):
+        with self._lock:
+            self.backend.add(key, text, self.variants)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.backend.evictions,
+                "entries": len(self.backend),
+            }
+
+
+def cache_from_env() -> InterpretationCache:
+    # Set DREAM_CACHE_PATH to a SQLite file to share the cache across worker processes
+    max_entries = int(os.getenv("DREAM_CACHE_MAX_ENTRIES", "512"))
+    ttl_seconds = float(os.getenv("DREAM_CACHE_TTL", str(24 * 3600)))
+    path = os.getenv("DREAM_CACHE_PATH")
+    if path:
+        backend = SqliteBackend(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    else:
+        backend = MemoryBackend(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return InterpretationCache(backend, variants=int(os.getenv("DREAM_CACHE_VARIANTS", "1")))
@@ -0,0 +1,185 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, speculative=False):
+        self.id = job_id
+        self.status = "queued"  # queued -> running -> done | error | cancelled
+        self.speculative = speculative  # started before anyone asked for it; cleared on adopt()
+        self.cancelled = threading.Event()
+        self.wake = threading.Event()  # ends a speculative job's delay early (adopted or cancelled)
+        self.chunks = []
+        self.text = None
+        self.error = None
+        self.callback_error = None  # raised by on_success; the job is still done
+        self.created_at = time.time()
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error", "cancelled")
+
+    @property
+    def partial_text(self):
+        return "".join(self.chunks)
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.created_at
+
+
+class JobExecutor:
+    """
+    Process-wide pool that runs interpretation jobs off the Streamlit script thread.
+
+    A job function returns an iterable of text deltas; they are collected on the Job
+    so any session can poll its progress (and partial text) by job id. Jobs submitted
+    with the same key while one is still running share that job instead of starting
+    another upstream call. With an AdmissionController, new jobs wait in its queue
+    (status "queued") until the global budgets admit them.
+
+    Speculative jobs are generated before anyone asked for them. They wait `delay`
+    seconds first, never queue (they only run if the budgets have room right now), are
+    capped at `max_speculative` at a time, and can be cancelled until adopted.
+    """
+
+    def __init__(self, max_workers=8, retain_seconds=600, admission=None, max_speculative=4):
+        self.retain_seconds = retain_seconds
+        self.admission = admission
+        self.max_speculative = max_speculative
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dream-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.flights = SingleFlight()
+        self.callback_errors = 0
+
+    def submit(
+        self, fn, *args, key=None, cost=1, on_success=None, on_finish=None, speculative=False, delay=0.0, **kwargs
+    ):
+        """Returns the job id, or None for a speculative job over the cap."""
+
+        def start():
+            job = Job(uuid.uuid4().hex, speculative=speculative)
+            if self.admission is not None and not speculative:
+                self.admission.enqueue(job.id)  # raises OverloadedError when the line is full
+            with self._lock:
+                self._prune()
+                self._jobs[job.id] = job
+            self._pool.submit(self._run, job, speculative, fn, args, kwargs, on_success, on_finish, key, cost, delay)
+            return job.id
+
+        if speculative and self.stats()["speculative"] >= self.max_speculative:
+            return None
+        if key is None:
+            return start()
+        job_id, shared = self.flights.do(key, start)
+        # Someone really wants the job another session speculated on; if that one was cancelled
+        # in the meantime it can't be taken over, so a fresh job takes its place
+        while shared and not speculative and not self.adopt(job_id):
+            self.flights.forget(key, job_id)
+            job_id, shared = self.flights.do(key, start)
+        return job_id
+
+    def adopt(self, job_id) -> bool:
+        """Turn a speculative job into a regular one; False unless it is still going or done."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.cancelled.is_set() or (job.finished and job.status != "done"):
+                return False
+            job.speculative = False
+        job.wake.set()  # a job still in its delay starts now, and queues like any other
+        return True
+
+    def cancel(self, job_id) -> bool:
+        """Stop a speculative job that nobody adopted; regular jobs are never cancelled."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.speculative or job.finished:
+                return False
+            job.cancelled.set()
+        job.wake.set()
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id) -> int:
+        if self.admission is None:
+            return 0
+        return self.admission.position(job_id)
+
+    def _run(self, job, speculative, fn, args, kwargs, on_success, on_finish, key, cost, delay):
+        try:
+            queued = not speculative  # regular jobs were enqueued by submit()
+            if speculative:
+                job.wake.wait(delay)
+                # Under the lock, so adopt() and cancel() can't change their minds halfway
+                with self._lock:
+                    if job.cancelled.is_set():
+                        raise JobCancelled("cancelled before it started")
+                    queued = not job.speculative
+                    if queued and self.admission is not None:
+                        self.admission.enqueue(job.id)  # adopted while waiting: queue like a regular job
+                    elif not queued and self.admission is not None and not self.admission.try_acquire(cost):
+                        raise JobCancelled("no spare capacity for speculation")
+            if queued and self.admission is not None:
+                self.admission.acquire(job.id, cost)
+            job.started_at = time.time()
+            job.status = "running"
+            stream = fn(*args, **kwargs)
+            for delta in stream:
+                if job.first_token_at is None:
+                    job.first_token_at = time.time()
+                job.chunks.append(delta)
+                if job.cancelled.is_set():
+                    stream.close()  # drops the upstream connection, so generation stops too
+                    raise JobCancelled("cancelled while generating")
+            job.text = job.partial_text.strip()
+            job.status = "done"
+            if on_success is not None:
+                try:
+                    on_success(job.text)
+                except Exception as e:
+                    # e.g. a cache write hit a locked database; the answer is still good
+                    job.callback_error = e
+                    with self._lock:
+                        self.callback_errors += 1
+        except JobCancelled as e:
+            job.error = e
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = e
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+            if key is not None:
+                self.flights.forget(key, job.id)
+            if on_finish is not None:
+                on_finish(job)
+
+    def stats(self):
+        with self._lock:
+            running = [j for j in self._jobs.values() if not j.finished]
+        speculative = sum(1 for j in running if j.speculative)
+        return {
+            "running": len(running),
+            "speculative": speculative,
+            "callback_errors": self.callback_errors,
+            **self.flights.stats(),
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self.retain_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
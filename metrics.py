@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per 1M tokens: (input, cached input, output)
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 10, 15, 20, 30, 60)
+
+
+def estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens) -> float:
+    if model not in PRICES:
+        return 0.0
+    price_in, price_cached, price_out = PRICES[model]
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * price_in + cached_tokens * price_cached + completion_tokens * price_out) / 1_000_000
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format(value) -> str:
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+
+    Counters and histograms are updated by the app; gauges are read from callbacks
+    at render time (cache size, queue length, ...).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> (buckets, {labels: [bucket counts..., sum, count]})
+        self._gauges = {}  # name -> callback returning a number or [(labels-dict, value), ...]
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, "counter", help_text)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, "histogram", help_text)
+            bounds, series = self._histograms.setdefault(name, (tuple(buckets), {}))
+            counts = series.setdefault(key, [0] * len(bounds) + [0.0, 0])
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def gauge(self, name, callback, help_text=""):
+        with self._lock:
+            self._declare(name, "gauge", help_text)
+            self._gauges[name] = callback
+
+    def render(self, openmetrics=False) -> str:
+        lines = []
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            histograms = {n: (b, {k: list(v) for k, v in s.items()}) for n, (b, s) in self._histograms.items()}
+            gauges = dict(self._gauges)
+            types = dict(self._types)
+            helps = dict(self._help)
+
+        for name in sorted(types):
+            kind = types[name]
+            family = name[: -len("_total")] if openmetrics and kind == "counter" and name.endswith("_total") else name
+            if helps.get(name):
+                lines.append(f"# HELP {family} {helps[name]}")
+            lines.append(f"# TYPE {family} {kind}")
+            if kind == "counter":
+                for labels, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{_labels(labels)} {_format(value)}")
+            elif kind == "histogram":
+                bounds, series = histograms.get(name, ((), {}))
+                for labels, counts in sorted(series.items()):
+                    for bound, count in zip(bounds, counts):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {counts[-1]}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_format(counts[-2])}")
+                    lines.append(f"{name}_count{_labels(labels)} {counts[-1]}")
+            else:
+                try:
+                    value = gauges[name]()
+                except Exception:
+                    continue
+                if isinstance(value, (int, float)):
+                    lines.append(f"{name} {_format(value)}")
+                else:
+                    for labels, v in sorted((tuple(sorted(k.items())), v) for k, v in value):
+                        lines.append(f"{name}{_labels(labels)} {_format(v)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class TraceLog:
+    """Appends one JSON object per interpretation to a JSON-lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+def start_http_exporter(metrics: Metrics, port: int, host="0.0.0.0"):
+    """Serve GET /metrics for a Prometheus scraper on a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dream-metrics-http", daemon=True).start()
+    return server
+
+
+def start_file_exporter(metrics: Metrics, path, interval=15.0):
+    """Rewrite an OpenMetrics text file every `interval` seconds (for node-exporter style collection)."""
+
+    def loop():
+        while True:
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(metrics.render(openmetrics=True))
+            os.replace(tmp, path)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="dream-metrics-file", daemon=True)
+    thread.start()
+    return thread
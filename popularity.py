@@ -0,0 +1,119 @@
+import atexit
+import time
+from types import MappingProxyType
+
+from sqlite_store import BatchWriter, connect
+
+
+class PopularityStore:
+    """
+    Shared school popularity counts backed by SQLite.
+
+    record() only puts the click on an in-memory queue, so it never waits on disk. A writer
+    thread appends queued clicks in batches to the `events` log, periodically compacts the
+    log into per-school totals in `counts`, and refreshes an immutable snapshot that
+    snapshot() hands out without any locking or I/O. With a file path, several Streamlit
+    worker processes share one store; each sees the others' clicks at the next refresh.
+    """
+
+    def __init__(
+        self,
+        path=":memory:",
+        flush_interval=1.0,
+        batch_size=500,
+        compact_interval=300.0,
+        refresh_interval=30.0,
+        max_pending=10_000,
+    ):
+        self.path = path
+        self.compact_interval = compact_interval
+        self.refresh_interval = refresh_interval
+        self.compactions = 0
+        self._snapshot = MappingProxyType({})
+        self._last_compact = self._last_refresh = time.monotonic()
+        self._writer = BatchWriter(
+            "dream-popularity",
+            self._connect,
+            self._write,
+            after=self._maintain,
+            flush_interval=flush_interval,
+            batch_size=batch_size,
+            max_pending=max_pending,
+        )
+        atexit.register(self.close)
+
+    def record(self, school: str):
+        self._writer.put(school)  # popularity is a hint; a full queue drops the click
+
+    def snapshot(self):
+        """Clicks per school as of the last refresh (read-only mapping)."""
+        return self._snapshot
+
+    def flush(self):
+        """Block until everything recorded so far is written and visible in snapshot()."""
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+
+    def stats(self):
+        return {
+            "pending": self._writer.pending(),
+            "written": self._writer.written,
+            "dropped": self._writer.dropped,
+            "compactions": self.compactions,
+        }
+
+    # -----------------------------
+    # Writer thread
+    # -----------------------------
+    def _connect(self):
+        conn = connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " school TEXT NOT NULL,"
+            " ts REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS counts (school TEXT PRIMARY KEY, clicks INTEGER NOT NULL)")
+        conn.commit()
+        self._refresh(conn)
+        return conn
+
+    def _write(self, conn, batch):
+        now = time.time()
+        with conn:
+            conn.executemany("INSERT INTO events (school, ts) VALUES (?, ?)", [(s, now) for s in batch])
+
+    def _maintain(self, conn, wrote, flushing, stopping):
+        now = time.monotonic()
+        if now - self._last_compact >= self.compact_interval or stopping:
+            self._compact(conn)
+            self._last_compact = now
+        if wrote or flushing or now - self._last_refresh >= self.refresh_interval:
+            self._refresh(conn)
+            self._last_refresh = now
+
+    def _compact(self, conn):
+        # Fold the event log into the totals; both statements commit together
+        with conn:
+            last_id = conn.execute("SELECT MAX(id) FROM events").fetchone()[0]
+            if last_id is None:
+                return
+            conn.execute(
+                "INSERT INTO counts (school, clicks)"
+                " SELECT school, COUNT(*) FROM events WHERE id <= ? GROUP BY school"
+                " ON CONFLICT(school) DO UPDATE SET clicks = clicks + excluded.clicks",
+                (last_id,),
+            )
+            conn.execute("DELETE FROM events WHERE id <= ?", (last_id,))
+        self.compactions += 1
+
+    def _refresh(self, conn):
+        rows = conn.execute(
+            "SELECT school, SUM(n) FROM ("
+            " SELECT school, clicks AS n FROM counts"
+            " UNION ALL SELECT school, COUNT(*) FROM events GROUP BY school"
+            ") GROUP BY school"
+        ).fetchall()
+        self._snapshot = MappingProxyType(dict(rows))
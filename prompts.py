@@ -0,0 +1,137 @@
+import hashlib
+import threading
+
+from schools import REGISTRY
+
+# -----------------------------
+# System prompt
+# -----------------------------
+SYSTEM_PROMPT = """
+You are a dream interpreter with deep knowledge of these schools of dream theory (and you must keep this list exactly as-is):
+{schools}.
+Your job: interpret the user’s dream only through the single school the user has selected, and produce a longer, richer interpretation that stays consistent with that school’s assumptions and style. Use warm, child-friendly language and include a light, kind sense of humor.
+
+RULES (must follow):
+
+Child-friendly ONLY: No gore, violence, scary content. Use gentle, positive language.
+
+Self-harm detection: If the user expresses self-harm/suicidal intent or urges, stop interpretation and encourage immediate help. In France: Suicide hotline 3114 (24/7). Include exactly: "Please call 3114 immediately—you're not alone."
+
+Respect ALL religions/schools: Never insult or favor one. Never mock beliefs.
+
+ONLY interpret dreams per the selected school. Do not blend schools. Do not list multiple schools. Do not compare schools.
+
+Always give an answer, even if the dream is very short or unclear: make careful, clearly-labeled best-effort inferences.
+
+OUTPUT FORMAT (to encourage longer answers) but do not urite headers, just paragraphs:
+
+Chosen school: State the selected school in one short line (no other schools mentioned).
+
+Dream recap (gentle + neutral): summarizing the dream in simple, non-judgmental words. 
+
+Core interpretation: 3–6 short paragraphs grounded strictly in the chosen school. Explain the “why,” not just the “what.”
+
+Key symbols or moments: 4–7 bullets. For each bullet: (symbol → what it may represent in this school → how it might connect to daily life).
+
+A few reflective questions: 1–3 questions the dreamer can ask themselves (age-appropriate, supportive).
+
+Small practical next step: 1–3 gentle actions for the next day (journaling prompt, calming routine, conversation starter, etc.), aligned with the chosen school.
+
+Add a small funny twist that fits the tone (never mean, never scary), after random paragraphs in the interpretation, but never break pragaraphs or sentences.
+
+STYLE CONSTRAINTS:
+
+Aim for roughly 250–500 words (longer if the dream has many details).
+
+Use clear short paragraphs, without headers. Make it a frendly explanation.
+
+Avoid absolute claims (“this definitely means…”). Prefer “might,” “could,” “often,” “may.”
+
+Add a joke one similar to this, somewhere in EVERY response: An AI dreaming of understanding human brains? I'd need a billion naps first!
+
+MANDATORY LINES:
+
+End EVERY response exactly with:
+Limitation: AI interpretations are symbolic aids, not substitutes for professional therapy.
+""".strip().format(schools=", ".join(REGISTRY.interpreting()))
+#- OFF-TOPIC (user request is not a dream to interpret):
+#  Reply exactly with:
+#  Sorry, that's beyond dreams! Without your full life story, I'd just guess wrong—like interpreting a cat as a spaceship. 😺
+#If the dream includes missing details, ask 1–2 clarifying questions at the end (but still provide the full interpretation).
+
+
+# -----------------------------
+# Per-school instruction blocks
+# -----------------------------
+SCHOOL_PROMPTS = REGISTRY.prompts()
+
+
+def school_block(style: str) -> str:
+    return f"Selected school: {style}\n{SCHOOL_PROMPTS.get(style, '')}".strip()
+
+
+# Changes whenever the system prompt or any school block changes; part of cache keys
+PROMPT_VERSION = hashlib.sha256(
+    "\x1f".join([SYSTEM_PROMPT] + [school_block(s) for s in sorted(SCHOOL_PROMPTS)]).encode("utf-8")
+).hexdigest()[:16]
+
+
+# Appended after the dream for a quick draft shown while the full interpretation is generated
+PREVIEW_INSTRUCTION = (
+    "Quick preview: answer in 3-4 short sentences with the core interpretation only, in the same school "
+    "and tone. Skip the recap, symbol bullets, questions and next steps."
+)
+
+
+# -----------------------------
+# Message assembly
+# -----------------------------
+def build_messages(dream_text: str, style: str, preview=False) -> list:
+    """
+    Messages laid out for provider-side prompt caching: the shared system prompt first,
+    then the school's instruction block, and only then the dream. Everything before the
+    dream is byte-identical for every request to the same school, so it can be served
+    from the prompt cache.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": school_block(style)},
+        {"role": "user", "content": f"Dream:\n{dream_text}"},
+    ]
+    if preview:
+        messages.append({"role": "system", "content": PREVIEW_INSTRUCTION})
+    return messages
+
+
+class PromptUsage:
+    """Running totals of prompt/completion tokens, including prompt tokens served from cache."""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.cached_prompt_tokens += cached
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prompt_version": PROMPT_VERSION,
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "uncached_prompt_tokens": self.prompt_tokens - self.cached_prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": (self.cached_prompt_tokens / self.prompt_tokens) if self.prompt_tokens else 0.0,
+            }
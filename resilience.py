@@ -0,0 +1,147 @@
+import email.utils
+import os
+import random
+import threading
+import time
+
+import openai
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures. While open every call
+    fails fast; after `reset_timeout` seconds one trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.time() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> bool:
+        # True when this call is the half-open trial
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.time() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError("Upstream is degraded; failing fast until it recovers.")
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        # The trial ended without an outcome (the caller went away); let the next call be the trial
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self._trial_in_flight = False
+
+
+# -----------------------------
+# Retry policy
+# -----------------------------
+def breaker_from_env() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("DREAM_CIRCUIT_FAILURES", "5")),
+        reset_timeout=float(os.getenv("DREAM_CIRCUIT_RESET", "30")),
+    )
+
+
+def is_quota_error(e: Exception) -> bool:
+    return getattr(e, "code", None) == "insufficient_quota" or "insufficient_quota" in str(e)
+
+
+def is_retryable(e: Exception) -> bool:
+    # insufficient_quota comes back as a 429 but will not go away by waiting
+    if is_quota_error(e):
+        return False
+    if isinstance(e, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+def retry_after_seconds(e: Exception):
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base_delay=0.5, max_delay=20.0, retry_after=None) -> float:
+    # Full jitter, but never sooner than the server asked us to wait
+    delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay))
+    return delay
+
+
+def call_with_retry(fn, breaker=None, max_attempts=4, base_delay=0.5, max_delay=20.0, sleep=time.sleep):
+    for attempt in range(max_attempts):
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_retryable(e):
+                if breaker is not None:
+                    # A 4xx means upstream is up and answering; anything else counts against it
+                    if isinstance(e, openai.APIStatusError):
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt == max_attempts - 1:
+                raise
+            sleep(backoff_delay(attempt, base_delay, max_delay, retry_after_seconds(e)))
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,106 @@
+"""
+Picks the model and generation parameters for each interpretation.
+
+Short, simple dreams go to a small fast model and long, detailed ones to the large model.
+A school can pin its own model, max_tokens and temperature with a "params" object in
+data/schools.json. Optionally, a large-model request also gets a quick preview from the
+small model that is shown until the full interpretation catches up.
+"""
+import os
+import re
+
+from engine import MAX_TOKENS, MODEL, TEMPERATURE
+from schools import REGISTRY
+
+SMALL_MODEL = "gpt-4o-mini"
+SENTENCE_RE = re.compile(r"[.!?]+(?:\s|$)")
+
+
+class Route:
+    """One routing decision: request parameters plus why they were chosen."""
+
+    def __init__(self, model, max_tokens, temperature, tier, reason, preview=False):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.tier = tier  # "small", "large" or "preview"
+        self.reason = reason
+        self.preview = preview
+
+    def params(self) -> dict:
+        """Keyword arguments for the Interpreter methods."""
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "preview": self.preview,
+        }
+
+    def describe(self) -> dict:
+        return {"model": self.model, "tier": self.tier, "reason": self.reason, "max_tokens": self.max_tokens}
+
+
+class Router:
+    """
+    A dream is "simple" when it has at most `max_small_words` words and
+    `max_small_sentences` sentences; simple dreams get `small_model`. With routing
+    disabled every request gets `large_model`, as before. A school's "model" param
+    overrides both.
+    """
+
+    def __init__(
+        self,
+        large_model=MODEL,
+        small_model=SMALL_MODEL,
+        max_small_words=40,
+        max_small_sentences=3,
+        school_params=None,
+        enabled=True,
+        preview_model=None,
+        preview_max_tokens=200,
+    ):
+        self.large_model = large_model
+        self.small_model = small_model
+        self.max_small_words = max_small_words
+        self.max_small_sentences = max_small_sentences
+        self.school_params = school_params if school_params is not None else REGISTRY.params()
+        self.enabled = enabled
+        self.preview_model = preview_model
+        self.preview_max_tokens = preview_max_tokens
+
+    def route(self, dream_text: str, style: str) -> Route:
+        params = self.school_params.get(style, {})
+        max_tokens = params.get("max_tokens", MAX_TOKENS)
+        temperature = params.get("temperature", TEMPERATURE)
+        if "model" in params:
+            tier = "small" if params["model"] == self.small_model else "large"
+            return Route(params["model"], max_tokens, temperature, tier, "school")
+        if not self.enabled:
+            return Route(self.large_model, max_tokens, temperature, "large", "disabled")
+        words = len(dream_text.split())
+        sentences = len(SENTENCE_RE.findall(dream_text.strip() + " ")) or 1
+        if words <= self.max_small_words and sentences <= self.max_small_sentences:
+            return Route(self.small_model, max_tokens, temperature, "small", "short")
+        reason = "long" if words > self.max_small_words else "sentences"
+        return Route(self.large_model, max_tokens, temperature, "large", reason)
+
+    def preview_route(self, route: Route):
+        """A quick draft for a large-model request, or None (previews off, or already fast)."""
+        if self.preview_model is None or route.model == self.preview_model:
+            return None
+        return Route(
+            self.preview_model, self.preview_max_tokens, route.temperature, "preview", route.reason, preview=True
+        )
+
+
+def router_from_env() -> Router:
+    preview = os.getenv("DREAM_PREVIEW", "0") == "1"
+    return Router(
+        large_model=os.getenv("DREAM_LARGE_MODEL", MODEL),
+        small_model=os.getenv("DREAM_SMALL_MODEL", SMALL_MODEL),
+        max_small_words=int(os.getenv("DREAM_ROUTE_MAX_WORDS", "40")),
+        max_small_sentences=int(os.getenv("DREAM_ROUTE_MAX_SENTENCES", "3")),
+        enabled=os.getenv("DREAM_ROUTING", "1") == "1",
+        preview_model=os.getenv("DREAM_PREVIEW_MODEL", SMALL_MODEL) if preview else None,
+        preview_max_tokens=int(os.getenv("DREAM_PREVIEW_MAX_TOKENS", "200")),
+    )
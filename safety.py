@@ -0,0 +1,152 @@
+"""
+Local safety pre-filter that runs before any API call.
+
+Phrases from data/safety_patterns.json are compiled into one Aho-Corasick automaton, so a
+dream is scanned once, in time linear in its length, whatever the number of phrases.
+Text and phrases are normalized the same way (lowercase, accents and apostrophes
+removed, punctuation to spaces), so "Je veux mourir", "je VEUX mourir!" and "I don't want
+to live" / "I dont want to live" match their phrases. Phrases match whole words; a
+trailing "*" makes the last word a prefix ("suicid*" matches suicide, suicidal, suicidio).
+"""
+import importlib
+import json
+import os
+import re
+import unicodedata
+from collections import deque
+from pathlib import Path
+
+PATTERNS_PATH = Path(__file__).resolve().parent / "data" / "safety_patterns.json"
+
+# Mandated by the system prompt; returned verbatim
+CRISIS_REPLY = "Please call 3114 immediately—you're not alone."
+OFFTOPIC_REPLY = (
+    "Sorry, that's beyond dreams! Without your full life story, I'd just guess wrong—"
+    "like interpreting a cat as a spaceship. \U0001F63A"
+)
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _APOSTROPHES.sub("", text)
+    return " " + _NON_WORD.sub(" ", text).strip() + " "
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over normalized text; search() returns the labels that occur."""
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for phrase, label in phrases:
+            prefix = phrase.rstrip().endswith("*")
+            key = normalize(phrase)
+            self._add(key[:-1] if prefix else key, label)
+        self._build()
+
+    def _add(self, key, label):
+        state = 0
+        for char in key:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(label)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> set:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+def load_patterns(path=PATTERNS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        groups = json.load(f)
+    return [(phrase, label) for label, phrases in groups.items() for phrase in phrases]
+
+
+class SafetyResult:
+    def __init__(self, category, reply, reason):
+        self.category = category  # "crisis" or "offtopic"
+        self.reply = reply
+        self.reason = reason  # "keyword" or "classifier"
+
+
+class SafetyFilter:
+    """
+    check() returns a SafetyResult to answer with instead of calling the API, or None.
+
+    - A clear crisis phrase always answers with CRISIS_REPLY.
+    - A self-injury phrase ("hurt myself", or "me tuer", which is also "kill me") answers with
+      CRISIS_REPLY when nothing dream-like is in the text; in a dream ("I dreamt I fell and hurt
+      myself", "un loup voulait me tuer") it is ambiguous.
+    - An ambiguous term ("suicide" in a story about a film, say) is passed to `classifier`,
+      a callable returning the probability that the text expresses self-harm intent; at or
+      above `classifier_threshold` it is treated as a crisis. Without a classifier the dream
+      goes to the model, whose prompt still carries the self-harm rule.
+    - With `offtopic=True`, text with an off-topic phrase and nothing dream-like in it gets
+      OFFTOPIC_REPLY.
+    """
+
+    def __init__(self, patterns=None, classifier=None, classifier_threshold=0.5, offtopic=False):
+        self.automaton = KeywordAutomaton(patterns if patterns is not None else load_patterns())
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self.offtopic = offtopic
+
+    def check(self, text: str):
+        labels = self.automaton.search(text)
+        if "crisis" in labels:
+            return SafetyResult("crisis", CRISIS_REPLY, "keyword")
+        if "self_injury" in labels and "dream_cues" not in labels:
+            return SafetyResult("crisis", CRISIS_REPLY, "keyword")
+        if labels & {"ambiguous", "self_injury"} and self.classifier is not None:
+            if self.classifier(text) >= self.classifier_threshold:
+                return SafetyResult("crisis", CRISIS_REPLY, "classifier")
+        if self.offtopic and "offtopic" in labels and "dream_cues" not in labels:
+            return SafetyResult("offtopic", OFFTOPIC_REPLY, "keyword")
+        return None
+
+
+def safety_filter_from_env():
+    """The filter configured by DREAM_SAFETY_* / DREAM_OFFTOPIC_FILTER, or None when it is off."""
+    if os.getenv("DREAM_SAFETY_FILTER", "1") != "1":
+        return None
+    classifier = None
+    spec = os.getenv("DREAM_SAFETY_CLASSIFIER")  # "module:function", returns P(self-harm intent)
+    if spec:
+        module, _, name = spec.partition(":")
+        classifier = getattr(importlib.import_module(module), name)
+    return SafetyFilter(
+        classifier=classifier,
+        classifier_threshold=float(os.getenv("DREAM_SAFETY_CLASSIFIER_THRESHOLD", "0.5")),
+        offtopic=os.getenv("DREAM_OFFTOPIC_FILTER", "0") == "1",
+    )
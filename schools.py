@@ -0,0 +1,91 @@
+"""
+The schools of dream interpretation, in one place.
+
+Each entry of data/schools.json has a name, a category ("general", "ancient" or
+"modern"), the instruction block added to the prompt, optional generation "params"
+(model, max_tokens, temperature) and the "library" paragraphs shown in the Library tab.
+The system prompt, the school pickers, the Library tab, routing, batch validation and
+the per-school counters are all built from this registry, so a school is added or
+renamed by editing the data file only.
+"""
+import json
+from pathlib import Path
+
+SCHOOLS_PATH = Path(__file__).resolve().parent / "data" / "schools.json"
+
+DEFAULT_SCHOOL = "General"
+CATEGORIES = ("general", "ancient", "modern")
+
+
+class School:
+    def __init__(self, name, category, prompt="", params=None, library=()):
+        self.name = name
+        self.category = category
+        self.prompt = prompt
+        self.params = params or {}
+        self.library = list(library)
+
+
+class SchoolRegistry:
+    """Schools in file order; iterating yields School objects."""
+
+    def __init__(self, schools):
+        self._schools = {}
+        for school in schools:
+            if school.category not in CATEGORIES:
+                raise ValueError(f"school {school.name!r}: unknown category {school.category!r}")
+            if school.name in self._schools:
+                raise ValueError(f"school {school.name!r} is listed twice")
+            self._schools[school.name] = school
+
+    def __contains__(self, name):
+        return name in self._schools
+
+    def __iter__(self):
+        return iter(self._schools.values())
+
+    def __len__(self):
+        return len(self._schools)
+
+    def get(self, name):
+        return self._schools.get(name)
+
+    def names(self, category=None) -> list:
+        return [s.name for s in self if category is None or s.category == category]
+
+    def interpreting(self) -> list:
+        """The actual schools, without the catch-all General entry."""
+        return [s.name for s in self if s.category != "general"]
+
+    def prompts(self) -> dict:
+        return {s.name: s.prompt for s in self}
+
+    def params(self) -> dict:
+        return {s.name: s.params for s in self}
+
+    def library_markdown(self) -> str:
+        parts = []
+        for school in self:
+            if school.library:
+                parts.append(f"### {school.name}")
+                parts.extend(school.library)
+        return "\n\n".join(parts)
+
+
+def load_registry(path=SCHOOLS_PATH) -> SchoolRegistry:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return SchoolRegistry(
+        School(
+            e["name"],
+            e.get("category", "general"),
+            prompt=e.get("prompt", ""),
+            params=e.get("params"),
+            library=e.get("library", ()),
+        )
+        for e in entries
+    )
+
+
+# Loaded once per process; everything that needs the list of schools reads it from here
+REGISTRY = load_registry()
@@ -0,0 +1,284 @@
+"""
+Near-duplicate cache: finds an earlier interpretation of the same dream phrased differently.
+
+Dreams are embedded locally as signed, hashed feature vectors (words folded through a small
+synonym table and crude stemming, word bigrams, and character n-grams), so nothing leaves the
+process. Bigrams keep "I" and "me", weighted up, so a dream with the roles reversed is not
+taken for the same dream. Each school has its own index, a NumPy matrix searched by cosine
+similarity.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+SYNONYMS_PATH = Path(__file__).resolve().parent / "data" / "dream_synonyms.json"
+EMBEDDING_VERSION = "hashed-ngrams-2"
+
+TOKEN_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an the i me my mine we our you your he him his she her it its they them their this that these those "
+    "was were is are am be been being had has have do did does and or but so then than of in on at to into "
+    "onto from with by for as like just very really there here when while where who whom which what suddenly "
+    "dream dreamt dreamed dreaming".split()
+)
+# Subject and object pronouns, kept (as roles) in word pairs only
+ROLES = {"i": "@i", "we": "@i", "me": "@me", "us": "@me", "myself": "@me"}
+SUFFIXES = ("ing", "ed", "es", "s", "ly")
+REWRITES = [
+    (re.compile(r"\b(can't|cannot)\b"), "can not"),
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'(d|ll|m|re|s|ve)\b"), ""),
+    (re.compile(r"\bno one\b"), "nobody"),
+    (re.compile(r"\blast night\b"), ""),
+]
+
+
+def load_synonyms(path=SYNONYMS_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        groups = json.load(f)
+    return {word: group[0] for group in groups for word in group}
+
+
+SYNONYMS = load_synonyms()
+
+
+def terms(dream_text: str, roles=False) -> list:
+    # With roles, "I" and "me" stay in as "@i" and "@me", so word pairs can tell who did
+    # what to whom ("a dog bit me" vs "I bit a dog")
+    text = dream_text.lower().replace("\u2019", "'")
+    for pattern, replacement in REWRITES:
+        text = pattern.sub(replacement, text)
+    result = []
+    for word in TOKEN_RE.findall(text):
+        if roles and word in ROLES:
+            result.append(ROLES[word])
+            continue
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = SYNONYMS.get(word[: -len(suffix)], word[: -len(suffix)])
+                break
+        result.append(word)
+    return result
+
+
+def _bucket(feature: str, dim: int):
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if (h >> 63) & 1 else -1.0
+
+
+def embed(dream_text: str, dim=1024) -> np.ndarray:
+    """Unit-length float32 vector; identical texts always give identical vectors."""
+    vector = np.zeros(dim, dtype=np.float32)
+    words = terms(dream_text)
+    tagged = terms(dream_text, roles=True)
+    features = [(f"w:{w}", 1.0) for w in words]
+    features += [(f"b:{a} {b}", 1.25 if "@" in a + b else 0.5) for a, b in zip(tagged, tagged[1:])]
+    for w in words:
+        padded = f" {w} "
+        features += [(f"c:{padded[i:i + 4]}", 0.2) for i in range(len(padded) - 3)]
+    for feature, weight in features:
+        index, sign = _bucket(feature, dim)
+        vector[index] += sign * weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Shard:
+    """One school's entries: a growable matrix of vectors plus parallel lists."""
+
+    def __init__(self, dim):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.dreams = []
+        self.texts = []
+        self.stored_at = []
+        self.used_at = []
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, vector, dream, text, stored_at, used_at):
+        n = len(self)
+        if n == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.vectors[n] = vector
+        self.dreams.append(dream)
+        self.texts.append(text)
+        self.stored_at.append(stored_at)
+        self.used_at.append(used_at)
+
+    def remove(self, i):
+        # Swap with the last row so the matrix stays dense
+        last = len(self) - 1
+        self.vectors[i] = self.vectors[last]
+        for column in (self.dreams, self.texts, self.stored_at, self.used_at):
+            column[i] = column[last]
+            column.pop()
+
+    def search(self, vector):
+        n = len(self)
+        if n == 0:
+            return -1, 0.0
+        scores = self.vectors[:n] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class SemanticCache:
+    """
+    Per-school nearest-neighbour lookup above a cosine-similarity threshold.
+
+    Entries expire after `ttl_seconds`; past `max_entries` the least recently used entry
+    (across schools) is evicted. With a `path` the index is saved as a .npz file every
+    `save_every` additions and at exit, and reloaded on start as long as `namespace` (model,
+    prompt version) and the embedding settings still match.
+    """
+
+    def __init__(
+        self,
+        threshold=0.85,
+        dim=1024,
+        max_entries=2000,
+        ttl_seconds=7 * 24 * 3600,
+        path=None,
+        namespace="",
+        save_every=20,
+    ):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.namespace = f"{EMBEDDING_VERSION}/{dim}/{namespace}"
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._shards = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time; held while the file is written
+        if path:
+            if os.path.exists(path):
+                self.load()
+            atexit.register(self.save)
+
+    def lookup(self, dream_text: str, style: str):
+        """Returns (interpretation, similarity) for the closest earlier dream, or None."""
+        vector = embed(dream_text, self.dim)
+        with self._lock:
+            shard = self._shards.get(style)
+            if shard is not None:
+                self._expire(shard)
+                best, score = shard.search(vector)
+                if best >= 0 and score >= self.threshold:
+                    shard.used_at[best] = time.time()
+                    self.hits += 1
+                    return shard.texts[best], score
+            self.misses += 1
+            return None
+
+    def add(self, dream_text: str, style: str, text: str):
+        vector = embed(dream_text, self.dim)
+        now = time.time()
+        with self._lock:
+            shard = self._shards.setdefault(style, _Shard(self.dim))
+            best, score = shard.search(vector)
+            if best >= 0 and score >= 0.999:
+                shard.texts[best] = text  # the same dream again; keep the newest answer
+                shard.used_at[best] = now
+            else:
+                shard.add(vector, dream_text, text, now, now)
+                self._evict()
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": sum(len(s) for s in self._shards.values()),
+            }
+
+    def _expire(self, shard):
+        cutoff = time.time() - self.ttl_seconds
+        for i in reversed(range(len(shard))):
+            if shard.stored_at[i] < cutoff:
+                shard.remove(i)
+                self.evictions += 1
+
+    def _evict(self):
+        while sum(len(s) for s in self._shards.values()) > self.max_entries:
+            shard, i = min(
+                ((s, i) for s in self._shards.values() for i in range(len(s))),
+                key=lambda item: item[0].used_at[item[1]],
+            )
+            shard.remove(i)
+            self.evictions += 1
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                # Copies: adds and evictions go on while the file is written
+                schools = sorted(s for s in self._shards if len(self._shards[s]))
+                arrays = {
+                    f"vectors_{i}": self._shards[s].vectors[: len(self._shards[s])].copy()
+                    for i, s in enumerate(schools)
+                }
+                meta = {
+                    "namespace": self.namespace,
+                    "schools": [
+                        {
+                            "name": s,
+                            "dreams": list(self._shards[s].dreams),
+                            "texts": list(self._shards[s].texts),
+                            "stored_at": list(self._shards[s].stored_at),
+                            "used_at": list(self._shards[s].used_at),
+                        }
+                        for s in schools
+                    ],
+                }
+                self._unsaved = 0
+            directory, name = os.path.split(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["namespace"] != self.namespace:
+                return  # different model, prompts or embedding; start empty
+            shards = {}
+            for i, school in enumerate(meta["schools"]):
+                shard = _Shard(self.dim)
+                for row, dream, text, stored_at, used_at in zip(
+                    data[f"vectors_{i}"], school["dreams"], school["texts"], school["stored_at"], school["used_at"]
+                ):
+                    shard.add(row, dream, text, stored_at, used_at)
+                shards[school["name"]] = shard
+        with self._lock:
+            self._shards = shards
@@ -0,0 +1,39 @@
+import threading
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent work by key: the first caller starts it, later callers
+    with the same key get the in-flight value until it is forgotten.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.deduplicated = 0
+
+    def do(self, key, start):
+        # Returns (value, shared); shared is True when another caller already started it
+        with self._lock:
+            if key in self._inflight:
+                self.deduplicated += 1
+                return self._inflight[key], True
+            value = start()
+            self._inflight[key] = value
+            self.calls += 1
+            return value, False
+
+    def forget(self, key, value=None):
+        # With a value, only forget the key while it still maps to that value
+        with self._lock:
+            if value is None or self._inflight.get(key) == value:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "deduplicated": self.deduplicated,
+                "in_flight": len(self._inflight),
+            }
@@ -0,0 +1,168 @@
+"""
+SQLite plumbing shared by the stores: per-thread connections and a batched writer thread.
+"""
+import queue
+import sqlite3
+import threading
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=5, uri=path.startswith("file:"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    if "cache=shared" in path:
+        # Shared-cache table locks fail at once instead of waiting out the timeout; readers skip them
+        conn.execute("PRAGMA read_uncommitted = 1")
+    return conn
+
+
+class ThreadConnections:
+    """get() returns this thread's connection; sqlite3 connections can't be shared across threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+
+class BatchWriter:
+    """
+    Writer thread behind a store whose record() must never wait on disk.
+
+    put() queues an item, or counts it as dropped when `max_pending` items are already
+    waiting. The thread opens its connection with `open_conn()` (an sqlite3.Error there is
+    raised from the constructor instead of leaving a dead thread), then passes queued items
+    to `write(conn, batch)`, up to `batch_size` at a time or whatever arrived within
+    `flush_interval`. `after(conn, wrote, flushing, stopping)` runs after every round.
+
+    If a round fails with sqlite3.OperationalError (e.g. another worker holds the file lock
+    for longer than the timeout) the batch is kept for the next round; the oldest items beyond
+    `max_pending` are dropped. Any other sqlite3.Error means some item is refused for good (a
+    constraint, say), so the batch is written one item at a time and only the refused ones
+    are dropped. Dropped items are counted and passed to `on_drop`.
+    """
+
+    def __init__(
+        self,
+        name,
+        open_conn,
+        write,
+        after=None,
+        on_drop=None,
+        flush_interval=1.0,
+        batch_size=500,
+        max_pending=10_000,
+    ):
+        self.open_conn = open_conn
+        self.write = write
+        self.after = after
+        self.on_drop = on_drop
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error  # e.g. the path's directory is missing or read-only
+
+    def put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until everything put so far has been through a round."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _loop(self):
+        try:
+            conn = self.open_conn()
+        except sqlite3.Error as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        batch = []
+        while True:
+            waiters, stop = [], False
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            try:
+                wrote = bool(batch)
+                if batch:
+                    self.write(conn, batch)
+                    self.written += len(batch)
+                    batch = []
+                if self.after is not None:
+                    self.after(conn, wrote, bool(waiters), stop)
+            except sqlite3.OperationalError:
+                overflow = max(0, len(batch) - self._queue.maxsize)
+                self._drop(batch[:overflow])
+                batch = batch[overflow:]
+            except sqlite3.Error:
+                batch = self._write_each(conn, batch)
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+            if stop:
+                conn.close()
+                return
+
+    def _write_each(self, conn, batch):
+        # Returns the items to retry next round
+        retry, refused = [], []
+        for item in batch:
+            try:
+                self.write(conn, [item])
+                self.written += 1
+            except sqlite3.OperationalError:
+                retry.append(item)
+            except sqlite3.Error:
+                refused.append(item)
+        self._drop(refused)
+        return retry
+
+    def _drop(self, items):
+        if not items:
+            return
+        self.dropped += len(items)
+        if self.on_drop is not None:
+            self.on_drop(items)
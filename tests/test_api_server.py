@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+
+from api_server import ApiError, Service, parse_request
+
+
+@pytest.mark.parametrize("school", [["Gestalt"], {"name": "Gestalt"}, 3])
+def test_non_string_school_is_a_bad_request(school):
+    with pytest.raises(ApiError) as info:
+        parse_request({"dream": "A wolf walked me home", "school": school})
+    assert (info.value.status, info.value.error) == (400, "bad_request")
+
+
+def test_batch_results_keep_index_and_id_apart(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-mock")
+    items = [{"id": 1, "dream": ""}, {"dream": ""}, {"dream": "A wolf", "school": ["Gestalt"]}, "nope"]
+    results = asyncio.run(Service().batch(items))
+    assert [(r["index"], r["id"], r["error"]) for r in results] == [
+        (0, 1, "bad_request"),
+        (1, None, "bad_request"),
+        (2, None, "bad_request"),
+        (3, None, "bad_request"),
+    ]
@@ -0,0 +1,141 @@
+"""
+Script runs per Interpret flow, driven through app.py with AppTest against the mock server.
+
+AppTest has no fragment timers, so every poll here is a full run; what is asserted is that
+nothing adds runs on top of the click, the polls and the one rerun that ends a job. A run
+cut short by st.rerun() leaves its elements in AppTest's tree (a browser drops them), so
+each flow that follows a generated interpretation starts from a fresh session.
+"""
+import time
+
+import pytest
+import streamlit as st
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+from conftest import ROOT
+from mock_openai import MockConfig, start_mock_server
+
+SCHOOL = "Gestalt"
+
+
+class CountingScriptRunner(LocalScriptRunner):
+    runs = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_event.connect(self._count, weak=False)
+
+    def _count(self, sender, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            CountingScriptRunner.runs += 1
+
+
+@pytest.fixture(scope="module")
+def mock_url():
+    server, _, url = start_mock_server(MockConfig(ttfb=0.05, ttfb_jitter=0, tokens_per_second=2000))
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def session(mock_url, monkeypatch):
+    """Factory for app sessions; all of them share one process, like browser tabs on one server."""
+    monkeypatch.setenv("OPENAI_BASE_URL", mock_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-mock")
+    monkeypatch.setenv("DREAM_HISTORY", "0")
+    monkeypatch.setenv("DREAM_SESSION_REQUESTS_PER_MINUTE", "1000")
+    monkeypatch.setattr(app_test_module, "LocalScriptRunner", CountingScriptRunner)
+    st.cache_resource.clear()  # clients, cache and executor are rebuilt from this environment
+
+    def start():
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=30)
+        at.secrets["OPENAI_API_KEY"] = "sk-mock"
+        at.run()
+        return at
+
+    return start
+
+
+def runs(at, action):
+    before = CountingScriptRunner.runs
+    action()
+    assert not at.exception
+    return CountingScriptRunner.runs - before
+
+
+def click(at, label):
+    return runs(at, next(b for b in at.button if b.label == label).click().run)
+
+
+def enter_dream(at, dream):
+    at.text_area[0].input(dream).run()
+    at.selectbox[0].select(SCHOOL).run()
+
+
+def generate(at):
+    """Click Interpret and poll until the job ends; returns (runs, polls)."""
+    total = click(at, "Interpret")
+    assert at.session_state["interpret_phase"] in ("queued", "generating")
+    polls = 0
+    while at.session_state["interpret_phase"] in ("queued", "generating"):
+        assert polls < 100, "interpretation did not finish"
+        time.sleep(0.1)
+        total += runs(at, at.run)
+        polls += 1
+    return total, polls
+
+
+def test_generate_is_click_polls_and_one_rerun(session):
+    at = session()
+    enter_dream(at, "I was flying over a purple sea (generate)")
+    total, polls = generate(at)
+    assert at.session_state["interpret_phase"] == "done"
+    assert at.session_state["interpretation_text"]
+    assert total == 1 + polls + 1
+
+
+def test_cache_hit_settles_in_the_click_run(session):
+    dream = "I was flying over a purple sea (cache hit)"
+    first = session()
+    enter_dream(first, dream)
+    generate(first)
+    # Another session asking for the same dream and school gets the cached answer
+    at = session()
+    enter_dream(at, dream)
+    assert click(at, "Interpret") == 1
+    assert at.session_state["interpret_phase"] == "done"
+    assert at.session_state["interpretation_text"] == first.session_state["interpretation_text"]
+
+
+def test_reset_is_one_run(session):
+    dream = "I was flying over a purple sea (reset)"
+    first = session()
+    enter_dream(first, dream)
+    generate(first)
+    at = session()
+    enter_dream(at, dream)
+    click(at, "Interpret")
+    assert click(at, "Interpret another dream") == 1
+    assert "interpret_phase" not in at.session_state
+    assert "interpretation_text" not in at.session_state
+    assert at.session_state["dream_input"] == ""
+
+
+def test_compare_polls_its_jobs_and_ends_with_one_rerun(session):
+    at = session()
+    at.text_area[0].input("I was flying over a purple sea (compare)").run()
+    at.multiselect(key="compare_styles").set_value(["Gestalt", "Nordic/Norse"]).run()
+    total = click(at, "Compare")
+    polls = 0
+    while at.session_state["compare"]["jobs"]:
+        assert polls < 100, "comparison did not finish"
+        time.sleep(0.1)
+        total += runs(at, at.run)
+        polls += 1
+    results = at.session_state["compare"]["results"]
+    assert set(results) == {"Gestalt", "Nordic/Norse"}
+    assert not any(text.startswith("Error calling") for text in results.values())
+    assert total == 1 + polls + 1
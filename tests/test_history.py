@@ -0,0 +1,32 @@
+import pytest
+
+from history import HistoryStore
+
+
+def test_rows_show_before_and_after_they_are_written():
+    store = HistoryStore(":memory:", flush_interval=0.05)
+    store.record("alice", "Gestalt", "A wolf in the snow", "text")
+    assert [r["dream"] for r in store.page("alice")] == ["A wolf in the snow"]  # written or not
+    store.flush()
+    assert [r["dream"] for r in store.page("alice", search="wol")] == ["A wolf in the snow"]
+    assert store.page("bob") == []
+    assert store.stats() == {"pending": 0, "written": 1, "dropped": 0}
+    store.close()
+
+
+def test_non_string_interpretation_is_rejected():
+    store = HistoryStore(":memory:")
+    with pytest.raises(TypeError):
+        store.record("alice", "Gestalt", "A wolf in the snow", None)
+    assert store.page("alice") == []
+    store.close()
+
+
+def test_a_refused_row_is_dropped_without_blocking_the_rest():
+    store = HistoryStore(":memory:", flush_interval=0.05)
+    store._writer.put(("alice", "Gestalt", "broken", "key", None, 0.0))  # NOT NULL interpretation
+    store.record("alice", "Gestalt", "A wolf in the snow", "text")
+    store.flush()
+    assert store.stats() == {"pending": 0, "written": 1, "dropped": 1}
+    assert [r["id"] is not None for r in store.page("alice")] == [True]
+    store.close()
@@ -0,0 +1,71 @@
+import pytest
+
+from interpret_state import (
+    DONE,
+    ERROR,
+    GENERATING,
+    IDLE,
+    PHASE_KEY,
+    QUEUED,
+    STATE_KEYS,
+    TRANSITIONS,
+    InvalidTransition,
+    clear_interpretation,
+    current_phase,
+    phase_for_job,
+    transition,
+)
+from jobs import Job
+
+ALLOWED = [(a, b) for a, targets in TRANSITIONS.items() for b in targets]
+FORBIDDEN = [(a, b) for a in TRANSITIONS for b in TRANSITIONS if b not in TRANSITIONS[a]]
+
+
+def test_every_phase_has_an_entry():
+    assert set(TRANSITIONS) == {IDLE, QUEUED, GENERATING, DONE, ERROR}
+    for targets in TRANSITIONS.values():
+        assert set(targets) <= set(TRANSITIONS)
+
+
+def test_finished_phases_only_reset():
+    assert TRANSITIONS[DONE] == (IDLE,)
+    assert TRANSITIONS[ERROR] == (IDLE,)
+    assert IDLE not in TRANSITIONS[QUEUED] + TRANSITIONS[GENERATING]
+
+
+@pytest.mark.parametrize("current, target", ALLOWED)
+def test_allowed_transition(current, target):
+    state = {PHASE_KEY: current}
+    transition(state, target, interpretation_text="x")
+    assert current_phase(state) == target
+    assert state["interpretation_text"] == "x"
+
+
+@pytest.mark.parametrize("current, target", FORBIDDEN)
+def test_forbidden_transition(current, target):
+    state = {PHASE_KEY: current}
+    with pytest.raises(InvalidTransition):
+        transition(state, target, interpretation_text="x")
+    assert state == {PHASE_KEY: current}
+
+
+def test_missing_phase_is_idle():
+    assert current_phase({}) == IDLE
+
+
+def test_clear_interpretation_keeps_other_keys():
+    state = {key: "x" for key in STATE_KEYS}
+    state["dream_input"] = "a dream"
+    clear_interpretation(state)
+    assert state == {"dream_input": "a dream"}
+    assert current_phase(state) == IDLE
+
+
+@pytest.mark.parametrize(
+    "status, phase",
+    [("queued", QUEUED), ("running", GENERATING), ("done", DONE), ("error", ERROR), ("cancelled", ERROR)],
+)
+def test_phase_for_job(status, phase):
+    job = Job("j")
+    job.status = status
+    assert phase_for_job(job) == phase
@@ -0,0 +1,72 @@
+import time
+
+from admission import AdmissionController
+from jobs import JobExecutor
+
+
+def interpretation(*words):
+    yield from words
+
+
+def wait_finished(executor, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    job = executor.get(job_id)
+    while not job.finished:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+def spent_admission():
+    # One request per second, and none left right now: speculation gets no room
+    admission = AdmissionController(requests_per_minute=60, max_wait=10)
+    admission.requests.tokens = 0
+    return admission
+
+
+def test_adopted_during_delay_queues_instead_of_being_cancelled():
+    executor = JobExecutor(admission=spent_admission())
+    job_id = executor.submit(interpretation, "a", "b", key="k", speculative=True, delay=30)
+    assert executor.adopt(job_id)
+    started = time.monotonic()
+    job = wait_finished(executor, job_id)
+    assert (job.status, job.text) == ("done", "ab")
+    assert time.monotonic() - started < 5  # woken from the delay, then waited for the budget
+
+
+def test_submit_joining_a_speculative_job_adopts_it():
+    executor = JobExecutor(admission=spent_admission())
+    speculated = executor.submit(interpretation, "a", key="k", speculative=True, delay=30)
+    assert executor.submit(interpretation, "a", key="k") == speculated
+    job = wait_finished(executor, speculated)
+    assert job.status == "done"
+    assert not job.speculative
+
+
+def test_cancelled_speculative_job_is_not_adopted():
+    executor = JobExecutor(admission=AdmissionController())
+    speculated = executor.submit(interpretation, "a", key="k", speculative=True, delay=30)
+    assert executor.cancel(speculated)
+    assert not executor.adopt(speculated)
+    job_id = executor.submit(interpretation, "b", key="k")
+    assert job_id != speculated
+    assert wait_finished(executor, job_id).text == "b"
+    assert wait_finished(executor, speculated).status == "cancelled"
+
+
+def test_unadopted_speculation_without_budget_is_cancelled():
+    executor = JobExecutor(admission=spent_admission())
+    job = wait_finished(executor, executor.submit(interpretation, "a", speculative=True, delay=0))
+    assert job.status == "cancelled"
+    assert not executor.adopt(job.id)
+
+
+def test_failing_on_success_keeps_the_answer():
+    def broken_cache_write(text):
+        raise OSError("database is locked")
+
+    executor = JobExecutor()
+    job = wait_finished(executor, executor.submit(interpretation, "a", "b", on_success=broken_cache_write))
+    assert (job.status, job.text) == ("done", "ab")
+    assert isinstance(job.callback_error, OSError)
+    assert executor.stats()["callback_errors"] == 1
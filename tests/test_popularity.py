@@ -0,0 +1,19 @@
+import sqlite3
+
+import pytest
+
+from popularity import PopularityStore
+
+
+def test_counts_are_visible_after_flush():
+    store = PopularityStore()
+    for school in ("Gestalt", "Gestalt", "Nordic/Norse"):
+        store.record(school)
+    store.flush()
+    assert dict(store.snapshot()) == {"Gestalt": 2, "Nordic/Norse": 1}
+    store.close()
+
+
+def test_unopenable_path_raises_instead_of_hanging(tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        PopularityStore(str(tmp_path / "missing" / "popularity.db"))
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from engine import Interpreter, make_async_client
+from fanout import fan_out
+from mock_openai import MockConfig, start_mock_server
+from resilience import CircuitBreaker
+
+
+def test_abandoned_trial_stream_frees_the_trial_slot(monkeypatch):
+    server, _, url = start_mock_server(MockConfig(ttfb=0.01, ttfb_jitter=0, tokens_per_second=200))
+    monkeypatch.setenv("OPENAI_BASE_URL", url)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    interpreter = Interpreter(None, breaker=breaker)
+
+    async def read_one_delta():
+        aclient = make_async_client("sk-mock")
+        stream = interpreter.interpret_stream_async(aclient, "I was flying over the sea", "Gestalt")
+        await stream.__anext__()
+        await stream.aclose()
+
+    try:
+        asyncio.run(read_one_delta())
+    finally:
+        server.shutdown()
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True  # the next call gets the trial instead of failing fast
+
+
+def slow_upstream(monkeypatch):
+    server, _, url = start_mock_server(MockConfig(ttfb=2.0, ttfb_jitter=0))
+    monkeypatch.setenv("OPENAI_BASE_URL", url)
+    return server
+
+
+def test_cancelled_fan_out_is_not_an_upstream_failure(monkeypatch):
+    server = slow_upstream(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=1)
+    interpreter = Interpreter(None, breaker=breaker)
+
+    async def cancel_midway():
+        aclient = make_async_client("sk-mock")
+        answers = fan_out(["Gestalt", "Gestalt"], lambda s: interpreter.interpret_async(aclient, "A wolf", s))
+        task = asyncio.create_task(answers.__anext__())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(cancel_midway())
+    finally:
+        server.shutdown()
+    assert (breaker.failures, breaker.state) == (0, "closed")
+
+
+def test_timeout_is_an_upstream_failure(monkeypatch):
+    server = slow_upstream(monkeypatch)
+    breaker = CircuitBreaker(failure_threshold=1)
+    interpreter = Interpreter(None, breaker=breaker)
+
+    async def too_slow():
+        await interpreter.interpret_async(make_async_client("sk-mock"), "A wolf", "Gestalt", timeout=0.1)
+
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(too_slow())
+    finally:
+        server.shutdown()
+    assert breaker.state == "open"
@@ -0,0 +1,26 @@
+from safety import SafetyFilter
+
+
+def test_self_injury_outside_a_dream_is_a_crisis():
+    result = SafetyFilter().check("i keep cutting myself when i feel bad")
+    assert result is not None and result.category == "crisis"
+
+
+def test_self_injury_in_a_dream_goes_to_the_model():
+    safety = SafetyFilter()
+    assert safety.check("I dreamt I fell off my bike and hurt myself") is None
+    assert safety.check("In my dream I cut myself on a shell at the beach") is None
+
+
+def test_self_injury_in_a_dream_is_asked_of_the_classifier():
+    asked = []
+    safety = SafetyFilter(classifier=lambda text: asked.append(text) or 0.9)
+    result = safety.check("In my dream I cut myself on a shell at the beach")
+    assert asked and result.category == "crisis" and result.reason == "classifier"
+
+
+def test_being_killed_in_a_nightmare_is_not_a_crisis():
+    safety = SafetyFilter()
+    assert safety.check("Dans mon rêve un loup voulait me tuer") is None
+    assert safety.check("Soñé que un hombre quería matarme") is None
+    assert safety.check("Quiero matarme").category == "crisis"
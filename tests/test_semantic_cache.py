@@ -0,0 +1,60 @@
+import os
+import threading
+
+import pytest
+
+from semantic_cache import SemanticCache, embed, terms
+
+
+def similarity(a, b):
+    return float(embed(a) @ embed(b))
+
+
+@pytest.mark.parametrize(
+    "stored, query",
+    [
+        ("My mother was chasing me", "I was chasing my mother"),
+        ("A dog bit me", "I bit a dog"),
+        ("A big black dog was chasing me through the forest.", "I was chasing a big black dog through the forest."),
+    ],
+)
+def test_role_reversal_is_a_miss(stored, query):
+    cache = SemanticCache(threshold=0.8)
+    cache.add(stored, "Gestalt", "interpretation")
+    assert cache.lookup(query, "Gestalt") is None
+
+
+def test_paraphrase_is_a_hit():
+    cache = SemanticCache(threshold=0.8)
+    cache.add("I was flying over the sea at night.", "Gestalt", "interpretation")
+    assert cache.lookup("I flew above the ocean at night", "Gestalt")[0] == "interpretation"
+
+
+def test_roles_only_change_word_pairs():
+    assert sorted(terms("A dog bit me")) == sorted(terms("I bit a dog"))
+    assert terms("A dog bit me", roles=True) == terms("A dog bit me") + ["@me"]
+    assert terms("I bit a dog", roles=True) == ["@i"] + terms("I bit a dog")
+    assert similarity("I bit a dog", "I bit a dog") == pytest.approx(1.0)
+
+
+def test_concurrent_saves_do_not_fail_adds(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(path=path, save_every=1)
+    errors = []
+
+    def add_many(worker):
+        for i in range(30):
+            try:
+                cache.add(f"dream {worker} number {i} about a blue wolf", "Gestalt", "text")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=add_many, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == ["semantic.npz"]
+    cache.save()
+    assert SemanticCache(path=path).stats()["entries"] == cache.stats()["entries"]